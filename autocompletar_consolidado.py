@@ -21,6 +21,9 @@ de solo lectura y genera un nuevo archivo de salida.
 import openpyxl
 import os
 
+# Lector directo del XML de los archivos '[CODIGO].xlsx', compartido con 'autocompletar_consolidado_v0.2.py'.
+from lector_xlsx import leer_cinco_celdas_rapido
+
 # --- Constantes de Configuración ---
 
 # Define la columna donde se espera encontrar el código en las hojas objetivo (D = 4)
@@ -38,6 +41,10 @@ COLUMNAS_DESTINO = {
     'M': 'N161'
 }
 
+# Conjunto de referencias de celdas de origen que se leen directamente del XML de la
+# hoja de cada archivo individual.
+CELDAS_ORIGEN = frozenset(COLUMNAS_DESTINO.values())
+
 # Lista de nombres de las hojas del archivo 'CONSOLIDADO.xlsx' que el script debe procesar.
 HOJAS_OBJETIVO = ['EDU', 'HOSP', 'EMPRESA']
 
@@ -71,8 +78,9 @@ def procesar_hoja(ws, ruta_base):
     """
     Procesa una hoja específica del archivo 'CONSOLIDADO.xlsx'.
 
-    Itera a través de las filas de la hoja, extrayendo un código de la
-    COL_CODIGO (Columna D). Utiliza este código para buscar y leer un
+    Itera a través de las filas de la hoja, desde FILA_INICIO hasta la última
+    fila con datos, extrayendo un código de la COL_CODIGO (Columna D). Las filas
+    sin código se omiten. Utiliza este código para buscar y leer un
     archivo Excel individual. Los valores de celdas predefinidas de este
     archivo individual se copian a las columnas de destino en la hoja actual.
 
@@ -84,17 +92,25 @@ def procesar_hoja(ws, ruta_base):
     individuales '[CODIGO].xlsx'.
     :type ruta_base: str
     """
-    fila = FILA_INICIO
-    # Bucle infinito que se rompe cuando no se encuentra un código en la fila actual
-    while True:
-        # Obtener el valor de la celda en la columna del código para la fila actual
-        codigo = ws.cell(row=fila, column=COL_CODIGO).value
+    # Última fila con datos de la hoja. Se recorre el rango completo en lugar de detenerse
+    # en la primera celda de código vacía, que puede ser solo un hueco entre filas con datos.
+    # Los códigos se leen con `iter_rows` acotado a la columna del código y a ese rango de filas
+    # (solo valores), en lugar de pedir cada celda con `ws.cell`.
+    codigos = ws.iter_rows(
+        min_row=FILA_INICIO,
+        max_row=ws.max_row,
+        min_col=COL_CODIGO,
+        max_col=COL_CODIGO,
+        values_only=True,
+    )
+    for fila, (codigo,) in enumerate(codigos, start=FILA_INICIO):
         if not codigo:
-            # Si la celda de código está vacía, se asume que no hay más datos y se sale del bucle
-            break
+            # Fila sin código: no hay nada que completar.
+            continue
 
-        # Limpiar el código (convertir a string y eliminar espacios en blanco)
-        codigo = str(codigo).strip()
+        # Limpiar el código: recortar espacios si ya es texto; los códigos numéricos solo
+        # se convierten a texto (no tienen espacios que recortar).
+        codigo = codigo.strip() if isinstance(codigo, str) else str(codigo)
         # Construir el nombre del archivo individual
         nombre_archivo = f"{codigo}.xlsx"
         # Construir la ruta completa al archivo individual
@@ -103,13 +119,18 @@ def procesar_hoja(ws, ruta_base):
         # Verificar si el archivo individual existe
         if os.path.isfile(ruta_archivo):
             try:
-                # Cargar el libro de trabajo del archivo individual en modo solo datos
-                # (ignora estilos, fórmulas, etc. para una carga más rápida)
-                wb_codigo = openpyxl.load_workbook(ruta_archivo, data_only=True)
+                try:
+                    # Leer las celdas de origen directamente del XML del archivo individual.
+                    valores = leer_cinco_celdas_rapido(ruta_archivo, CELDAS_ORIGEN)
+                except Exception:
+                    # Estructura no soportada por el lector directo: se carga el libro con
+                    # openpyxl en modo solo datos (ignora estilos, fórmulas, etc.).
+                    wb_codigo = openpyxl.load_workbook(ruta_archivo, data_only=True)
+                    valores = {celda: cargar_valor(wb_codigo, celda) for celda in CELDAS_ORIGEN}
                 # Iterar sobre las columnas de destino y sus celdas de origen correspondientes
                 for col_letra, celda in COLUMNAS_DESTINO.items():
-                    # Cargar el valor de la celda de origen
-                    valor = cargar_valor(wb_codigo, celda)
+                    # Obtener el valor de la celda de origen
+                    valor = valores[celda]
                     # Convertir la letra de la columna a su índice numérico (ej. 'F' -> 6)
                     col_index = openpyxl.utils.column_index_from_string(col_letra)
                     # Escribir el valor en la celda de destino en la hoja actual
@@ -122,8 +143,6 @@ def procesar_hoja(ws, ruta_base):
             # Reportar si el archivo individual no fue encontrado
             print(f"  • Fila {fila:>4} | Código: {codigo:<10} | Estado: Archivo no encontrado")
 
-        fila += 1 # Avanzar a la siguiente fila
-
 # --- Función Principal ---
 
 def main():
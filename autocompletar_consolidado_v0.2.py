@@ -20,10 +20,42 @@ datos originales y los nuevos, sin haber modificado el archivo maestro original
 directamente en un modo que consuma mucha memoria.
 """
 
+import argparse
+import asyncio
+import csv
+import multiprocessing
 import openpyxl
 import os
+import pickle
 import sys
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+
+# Lector directo del XML de los archivos '[CODIGO].xlsx', compartido con 'autocompletar_consolidado.py'.
+from lector_xlsx import leer_cinco_celdas_rapido
+
+# python-calamine (lector en Rust) es opcional: si está instalado se usa para leer
+# los archivos '[CODIGO].xlsx', mucho más rápido que el analizador XML de openpyxl.
+# Si no está disponible, el script sigue funcionando con openpyxl.
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# XlsxWriter es opcional: si está instalado se usa para escribir la salida .xlsx, más
+# rápido que openpyxl. Si no está disponible, se usa openpyxl en modo de solo escritura.
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# pyarrow es opcional: solo se necesita para generar la salida en formato Parquet.
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 # --- Constantes de Configuración ---
 
@@ -50,6 +82,30 @@ COL_INDICES_DESTINO = {
     for col_letra, celda in COLUMNAS_DESTINO.items()
 }
 
+# Posiciones 0-indexed de las columnas de destino dentro de la lista de valores de una fila,
+# en el mismo orden que los valores leídos de cada archivo individual, y la columna de
+# destino más alta (longitud mínima que debe tener una fila para recibir los valores).
+DEST_APPLY = tuple(col_index - 1 for col_index in COL_INDICES_DESTINO)
+MAX_DEST_COL = max(COL_INDICES_DESTINO)
+
+# Coordenadas (fila, columna) 1-indexed de las celdas de origen, en el mismo orden que
+# COL_INDICES_DESTINO. Se calculan una sola vez para no volver a analizar la referencia
+# de texto (ej. 'N21') cada vez que se lee una celda.
+CELDAS_ORIGEN_RC = tuple(
+    openpyxl.utils.cell.coordinate_to_tuple(celda) for celda in COL_INDICES_DESTINO.values()
+)
+
+# Posiciones (fila, columna) 0-indexed de las celdas de origen, para indexar directamente
+# la matriz de valores que devuelve python-calamine.
+POSICIONES_ORIGEN = tuple((fila - 1, columna - 1) for fila, columna in CELDAS_ORIGEN_RC)
+
+# Número de filas que hay que leer de cada archivo individual para alcanzar todas las celdas de origen.
+FILAS_ORIGEN_NECESARIAS = max(fila for fila, _ in POSICIONES_ORIGEN) + 1
+
+# Conjunto de referencias de celdas de origen que se leen directamente del XML de la
+# hoja de cada archivo individual.
+CELDAS_ORIGEN = frozenset(COL_INDICES_DESTINO.values())
+
 # Lista de nombres de las hojas del archivo 'CONSOLIDADO.xlsx' que el script debe procesar
 # para buscar y rellenar datos.
 HOJAS_OBJETIVO = ['EDU', 'HOSP', 'EMPRESA']
@@ -58,31 +114,714 @@ HOJAS_OBJETIVO = ['EDU', 'HOSP', 'EMPRESA']
 # Las filas anteriores a esta se consideran encabezados o metadatos y se copian directamente.
 FILA_INICIO_DATOS = 6 # Fila 6 (1-indexed)
 
+# Número de mensajes de estado por fila que se acumulan antes de escribirlos en la consola.
+# Escribir en bloque evita una escritura (y un vaciado del búfer) por fila, que en la
+# consola de Windows es especialmente lento.
+LINEAS_POR_VOLCADO = 500
+
+# Formatos de salida admitidos. 'xlsx' genera 'CONSOLIDADO_COMPLETADO.xlsx'; 'csv' y 'parquet'
+# generan un archivo por hoja ('CONSOLIDADO_COMPLETADO_[HOJA].csv' / '.parquet').
+FORMATOS_SALIDA = ('xlsx', 'csv', 'parquet')
+
+# Número de filas que se acumulan por hoja antes de escribir un bloque en un archivo Parquet.
+FILAS_POR_LOTE_PARQUET = 10000
+
+# Número máximo de archivos '[CODIGO].xlsx' que se leen a la vez con '--async-io'.
+LECTURAS_SIMULTANEAS = 16
+
+# Directorio (dentro del directorio de trabajo) donde se guarda la caché persistente
+# de los valores leídos de cada archivo '[CODIGO].xlsx' entre ejecuciones.
+DIRECTORIO_CACHE = '.cache_consolidado'
+
+# Versión del formato de las entradas de la caché. Se incrementa cuando cambia la forma de
+# leer los valores (ej. 2: las fechas se guardan como datetime y no como número de serie),
+# para que las entradas guardadas por versiones anteriores se vuelvan a leer.
+VERSION_CACHE = 2
+
 # --- Funciones Auxiliares ---
 
-def cargar_valor_desde_origen(wb_origen, celda_ref):
+def cargar_valor_desde_origen(ws_origen, fila, columna):
     """
-    Carga el valor de una celda específica del libro de trabajo de origen.
+    Carga el valor de una celda específica de la hoja de origen.
 
     Esta función es una envoltura segura para acceder a los valores de las celdas,
     capturando cualquier excepción y devolviendo None si la celda no existe o
     si ocurre algún otro problema al intentar acceder a su valor.
 
-    :param wb_origen: El objeto Workbook de openpyxl del cual se extraerá el valor.
-    Este Workbook debe estar abierto y activo.
-    :type wb_origen: openpyxl.workbook.workbook.Workbook
-    :param celda_ref: La referencia de la celda (ej. 'N21') cuyo valor se desea obtener.
-    :type celda_ref: str
+    :param ws_origen: La hoja de openpyxl (normalmente la hoja activa del libro de
+    origen) de la cual se extraerá el valor.
+    :type ws_origen: openpyxl.worksheet.worksheet.Worksheet
+    :param fila: El número de fila de la celda (1-indexed).
+    :type fila: int
+    :param columna: El número de columna de la celda (1-indexed).
+    :type columna: int
     :returns: El valor de la celda si existe, de lo contrario, None.
     :rtype: any or None
     """
     try:
-        # Acceder a la hoja activa y a la celda por su referencia para obtener su valor.
-        return wb_origen.active[celda_ref].value
+        # Acceder a la celda por sus coordenadas numéricas, sin analizar una referencia de texto.
+        return ws_origen.cell(row=fila, column=columna).value
     except Exception:
         # En caso de cualquier error (ej. celda no encontrada), se devuelve None.
         return None
 
+def normalizar_valor_calamine(valor):
+    """
+    Adapta un valor devuelto por python-calamine al tipo que devolvería openpyxl.
+
+    python-calamine representa las celdas vacías como cadena vacía y todos los
+    números como float; openpyxl devuelve None y enteros cuando el valor es entero.
+
+    :param valor: El valor leído por python-calamine.
+    :type valor: any
+    :returns: El valor equivalente al que devolvería openpyxl.
+    :rtype: any or None
+    """
+    if valor == '':
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def leer_celdas_calamine(ruta_archivo_origen):
+    """
+    Lee las celdas de origen de un archivo '[CODIGO].xlsx' con python-calamine.
+
+    Se lee la primera hoja del archivo (la hoja activa en los archivos habituales)
+    hasta la última fila necesaria y se indexa la matriz resultante con las
+    posiciones precalculadas en POSICIONES_ORIGEN.
+
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: Los valores de las celdas de origen, en el mismo orden que COL_INDICES_DESTINO.
+    :rtype: tuple
+    """
+    wb_codigo = CalamineWorkbook.from_path(ruta_archivo_origen)
+    try:
+        # skip_empty_area=False mantiene la fila 1 / columna A en el índice 0 de la matriz.
+        filas = wb_codigo.get_sheet_by_index(0).to_python(
+            skip_empty_area=False, nrows=FILAS_ORIGEN_NECESARIAS
+        )
+    finally:
+        wb_codigo.close()
+
+    valores = []
+    for fila, columna in POSICIONES_ORIGEN:
+        # Las celdas fuera del rango usado de la hoja se consideran vacías.
+        if fila < len(filas) and columna < len(filas[fila]):
+            valores.append(normalizar_valor_calamine(filas[fila][columna]))
+        else:
+            valores.append(None)
+    return tuple(valores)
+
+def leer_celdas_codigo(ruta_archivo_origen):
+    """
+    Lee los valores de las celdas de origen de un archivo individual '[CODIGO].xlsx'.
+
+    Las excepciones se propagan al llamador, que las reporta en las filas del código.
+
+    La lectura se hace directamente sobre el XML del archivo. Si su estructura no
+    es la esperada, se recurre a python-calamine (si está instalado) o a openpyxl.
+
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: Los valores de las celdas de origen, en el mismo orden que COL_INDICES_DESTINO.
+    :rtype: tuple
+    """
+    try:
+        valores = leer_cinco_celdas_rapido(ruta_archivo_origen, CELDAS_ORIGEN)
+        return tuple(valores[celda_ref_origen] for celda_ref_origen in COL_INDICES_DESTINO.values())
+    except Exception:
+        # Estructura no soportada por el lector directo: se usa un lector completo,
+        # que también reportará el error si el archivo está realmente dañado.
+        pass
+
+    if CalamineWorkbook is not None:
+        return leer_celdas_calamine(ruta_archivo_origen)
+
+    # Solo se necesitan valores: modo solo lectura y solo datos para una carga más ligera.
+    wb_codigo = openpyxl.load_workbook(ruta_archivo_origen, read_only=True, data_only=True)
+    try:
+        # Resolver la hoja activa una sola vez para todas las celdas.
+        ws_codigo = wb_codigo.active
+        return tuple(
+            cargar_valor_desde_origen(ws_codigo, fila, columna)
+            for fila, columna in CELDAS_ORIGEN_RC
+        )
+    finally:
+        # Liberar el archivo aunque la lectura falle.
+        wb_codigo.close()
+
+def leer_cinco_celdas(ruta_archivo_origen):
+    """
+    Lee las celdas de origen de un archivo '[CODIGO].xlsx' dentro de un proceso del pool.
+
+    Es una función de nivel de módulo para que pueda enviarse a los procesos de
+    ProcessPoolExecutor. Captura cualquier error de lectura y lo devuelve como
+    texto, de forma que un archivo defectuoso no interrumpa la lectura del resto.
+
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: Una tupla (valores, error): los valores leídos y None si la lectura
+    fue correcta, o None y el mensaje de error si falló.
+    :rtype: tuple
+    """
+    try:
+        return leer_celdas_codigo(ruta_archivo_origen), None
+    except Exception as e:
+        return None, str(e)
+
+def estado_archivo(ruta_archivo_origen):
+    """
+    Obtiene la huella (tamaño y fecha de modificación) de un archivo individual.
+
+    Se usa para decidir si los valores guardados en la caché siguen siendo válidos:
+    cualquier cambio en el archivo modifica su tamaño o su fecha de modificación.
+
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: Una tupla (tamaño en bytes, fecha de modificación en nanosegundos).
+    :rtype: tuple
+    """
+    stat = os.stat(ruta_archivo_origen)
+    return stat.st_size, stat.st_mtime_ns
+
+def ruta_cache(directorio_cache, ruta_archivo_origen):
+    """
+    Construye la ruta del archivo de caché '[CODIGO].pkl' de un archivo individual.
+
+    :param directorio_cache: Directorio de la caché persistente.
+    :type directorio_cache: str
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: La ruta del archivo de caché.
+    :rtype: str
+    """
+    codigo = os.path.splitext(os.path.basename(ruta_archivo_origen))[0]
+    return os.path.join(directorio_cache, f"{codigo}.pkl")
+
+def cargar_desde_cache(directorio_cache, ruta_archivo_origen):
+    """
+    Recupera de la caché persistente los valores de un archivo individual.
+
+    Los valores solo se consideran válidos si el archivo no ha cambiado desde que se
+    guardaron (mismo tamaño y fecha de modificación), si se leyeron las mismas
+    celdas de origen y si la entrada tiene la versión actual (VERSION_CACHE).
+    Cualquier problema al leer la caché se trata como un fallo de caché, de modo
+    que el archivo simplemente se vuelve a leer.
+
+    :param directorio_cache: Directorio de la caché persistente.
+    :type directorio_cache: str
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :returns: Los valores guardados, o None si no hay una entrada válida.
+    :rtype: tuple or None
+    """
+    try:
+        with open(ruta_cache(directorio_cache, ruta_archivo_origen), 'rb') as f:
+            entrada = pickle.load(f)
+        if (entrada.get('version') == VERSION_CACHE
+                and entrada['estado'] == estado_archivo(ruta_archivo_origen)
+                and entrada['celdas'] == tuple(COL_INDICES_DESTINO.values())):
+            return entrada['valores']
+    except Exception:
+        pass
+    return None
+
+def guardar_en_cache(directorio_cache, ruta_archivo_origen, valores):
+    """
+    Guarda en la caché persistente los valores leídos de un archivo individual.
+
+    El archivo de caché se escribe primero con un nombre temporal y luego se
+    renombra, para que una ejecución interrumpida nunca deje una entrada a medias.
+    Los errores al escribir la caché no interrumpen el proceso.
+
+    :param directorio_cache: Directorio de la caché persistente.
+    :type directorio_cache: str
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :param valores: Los valores de las celdas de origen leídos del archivo.
+    :type valores: tuple
+    """
+    entrada = {
+        'version': VERSION_CACHE,
+        'estado': estado_archivo(ruta_archivo_origen),
+        'celdas': tuple(COL_INDICES_DESTINO.values()),
+        'valores': valores,
+    }
+    destino = ruta_cache(directorio_cache, ruta_archivo_origen)
+    try:
+        os.makedirs(directorio_cache, exist_ok=True)
+        with open(destino + '.tmp', 'wb') as f:
+            pickle.dump(entrada, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(destino + '.tmp', destino)
+    except OSError as e:
+        print(f"DEBUG: No se pudo guardar la caché de '{os.path.basename(ruta_archivo_origen)}': {e}")
+
+class HojaSalidaXlsxWriter:
+    """
+    Hoja de una SalidaXlsxWriter: escribe cada fila añadida a continuación de la anterior.
+    """
+
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+        self._fila = 0
+
+    def append(self, row):
+        """Escribe una fila de valores en la siguiente fila de la hoja (None deja la celda vacía)."""
+        try:
+            self._worksheet.write_row(self._fila, 0, row)
+        except TypeError:
+            # La fila contiene fórmulas matriciales o tablas de datos (objetos de openpyxl
+            # que `write_row` no admite): se reescribe celda a celda.
+            self._escribir_celdas(row)
+        self._fila += 1
+
+    def _escribir_celdas(self, row):
+        """Escribe una fila celda a celda, convirtiendo las fórmulas especiales de openpyxl."""
+        for col_index, valor in enumerate(row):
+            if isinstance(valor, ArrayFormula):
+                # La fórmula matricial ocupa el mismo rango que en el archivo original.
+                min_col, min_fila, max_col, max_fila = openpyxl.utils.cell.range_boundaries(valor.ref)
+                self._worksheet.write_array_formula(
+                    min_fila - 1, min_col - 1, max_fila - 1, max_col - 1, valor.text or ''
+                )
+            elif isinstance(valor, DataTableFormula):
+                # XlsxWriter no puede crear tablas de datos: se deja el texto que muestra Excel.
+                self._worksheet.write_string(
+                    self._fila, col_index, f"{{=TABLE({valor.r1 or ''},{valor.r2 or ''})}}"
+                )
+            else:
+                self._worksheet.write(self._fila, col_index, valor)
+
+class SalidaXlsxWriter:
+    """
+    Salida .xlsx escrita con XlsxWriter, con la misma interfaz que un Workbook de openpyxl
+    en modo `write_only` (`create_sheet`, `sheetnames`, `save`).
+
+    Con `constant_memory` cada fila se vuelca a disco en cuanto se pasa a la siguiente,
+    de modo que la memoria no crece con el tamaño de la hoja. Como en openpyxl, los
+    textos que empiezan por '=' se escriben como fórmulas, los textos con forma de URL
+    se escriben como texto (no como hipervínculos) y las fechas reciben un formato de
+    fecha por defecto.
+    """
+
+    def __init__(self, ruta_absoluta_salida):
+        self._workbook = xlsxwriter.Workbook(ruta_absoluta_salida, {
+            'constant_memory': True,
+            'strings_to_urls': False,
+            'default_date_format': 'yyyy-mm-dd h:mm:ss',
+        })
+        self._hojas = {}
+
+    @property
+    def sheetnames(self):
+        return list(self._hojas)
+
+    def create_sheet(self, title):
+        """Añade una hoja al libro y devuelve un objeto con el método `append`."""
+        self._hojas[title] = HojaSalidaXlsxWriter(self._workbook.add_worksheet(title))
+        return self._hojas[title]
+
+    def save(self, ruta_absoluta_salida):
+        """
+        Termina de escribir el libro. La ruta se fijó al crear la salida;
+        `ruta_absoluta_salida` solo se acepta por compatibilidad con openpyxl.
+        """
+        self._workbook.close()
+
+class HojaSalidaCsv:
+    """
+    Hoja de una SalidaCsv: escribe cada fila añadida directamente en su archivo CSV.
+    """
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self._writer = csv.writer(archivo)
+
+    def append(self, row):
+        """Escribe una fila de valores (None se escribe como celda vacía)."""
+        self._writer.writerow(row)
+
+class SalidaCsv:
+    """
+    Salida en formato CSV, con la misma interfaz que un Workbook de openpyxl en modo
+    `write_only` (`create_sheet`, `sheetnames`, `save`).
+
+    Cada hoja se escribe en streaming en su propio archivo '[PREFIJO]_[HOJA].csv',
+    sin pasar por un libro de Excel. Se usa UTF-8 con BOM para que Excel reconozca
+    la codificación al abrir el archivo.
+    """
+
+    def __init__(self, ruta_prefijo):
+        self.ruta_prefijo = ruta_prefijo
+        self.archivos = []
+        self._hojas = {}
+
+    @property
+    def sheetnames(self):
+        return list(self._hojas)
+
+    def create_sheet(self, title):
+        """Crea el archivo CSV de la hoja y devuelve un objeto con el método `append`."""
+        ruta = f"{self.ruta_prefijo}_{title}.csv"
+        archivo = open(ruta, 'w', newline='', encoding='utf-8-sig')
+        self.archivos.append(ruta)
+        self._hojas[title] = HojaSalidaCsv(archivo)
+        return self._hojas[title]
+
+    def save(self, ruta_absoluta_salida):
+        """
+        Cierra los archivos CSV. Los nombres de los archivos se fijaron al crear cada
+        hoja; `ruta_absoluta_salida` solo se acepta por compatibilidad con openpyxl.
+        """
+        for hoja in self._hojas.values():
+            hoja._archivo.close()
+
+class HojaSalidaParquet:
+    """
+    Hoja de una SalidaParquet: acumula filas y las escribe por lotes en su archivo Parquet.
+
+    Los nombres de las columnas se toman de la fila de encabezado; las filas anteriores
+    a ella (títulos, metadatos) no se incluyen. Todas las columnas se guardan como texto,
+    ya que una misma columna de Excel puede mezclar números, textos y fechas.
+
+    El número de columnas se fija al escribir el primer lote: el mayor entre el
+    encabezado, el ancho mínimo y la fila más ancha del lote. Las filas no siempre
+    tienen el mismo ancho (ver `revisar_dimensiones`), y un archivo Parquet no admite
+    columnas nuevas una vez empezado: si una fila posterior tiene datos fuera de esas
+    columnas se lanza un error en lugar de descartarlos.
+    """
+
+    def __init__(self, ruta, fila_encabezado, ancho_minimo):
+        self.ruta = ruta
+        self._fila_encabezado = fila_encabezado
+        self._ancho_minimo = ancho_minimo
+        self._filas_recibidas = 0
+        self._encabezado = ()
+        self._lote = []
+        self._schema = None
+        self._writer = None
+
+    def append(self, row):
+        """Añade una fila; el lote se escribe al alcanzar FILAS_POR_LOTE_PARQUET filas."""
+        self._filas_recibidas += 1
+        if self._filas_recibidas < self._fila_encabezado:
+            return
+        if self._filas_recibidas == self._fila_encabezado:
+            self._encabezado = tuple(row)
+            return
+        if self._schema is not None and len(row) > len(self._schema):
+            self._comprobar_ancho(row)
+        self._lote.append(row)
+        if len(self._lote) >= FILAS_POR_LOTE_PARQUET:
+            self._escribir_lote()
+
+    def _comprobar_ancho(self, row):
+        """Lanza ValueError si la fila tiene datos fuera de las columnas del archivo."""
+        ancho = len(self._schema)
+        for col_index in range(ancho, len(row)):
+            if row[col_index] is not None:
+                letra = openpyxl.utils.get_column_letter(col_index + 1)
+                raise ValueError(
+                    f"La fila {self._filas_recibidas} tiene datos en la columna {letra}, fuera de las "
+                    f"{ancho} columnas del archivo '{self.ruta}' (fijadas con las primeras "
+                    f"{FILAS_POR_LOTE_PARQUET} filas). Usa '--output-format csv' o 'xlsx'."
+                )
+
+    def _definir_columnas(self):
+        """Construye el esquema a partir de la fila de encabezado y de las filas del primer lote."""
+        ancho = max([len(self._encabezado), self._ancho_minimo] + [len(row) for row in self._lote])
+        nombres = []
+        for col_index in range(1, ancho + 1):
+            letra = openpyxl.utils.get_column_letter(col_index)
+            valor = self._encabezado[col_index - 1] if col_index <= len(self._encabezado) else None
+            nombre = str(valor).strip() if valor is not None and str(valor).strip() else letra
+            # Los nombres de columna deben ser únicos: se desambiguan con la letra de la columna.
+            if nombre in nombres:
+                nombre = f"{nombre}_{letra}"
+            nombres.append(nombre)
+        self._schema = pyarrow.schema([(nombre, pyarrow.string()) for nombre in nombres])
+
+    def _escribir_lote(self):
+        """Convierte el lote acumulado a columnas de texto y lo escribe en el archivo."""
+        if self._schema is None:
+            # Si la hoja no llega a la fila de encabezado, las columnas se nombran por su letra.
+            self._definir_columnas()
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self.ruta, self._schema)
+        ancho = len(self._schema)
+        columnas = [[] for _ in range(ancho)]
+        for row in self._lote:
+            for col_index in range(ancho):
+                valor = row[col_index] if col_index < len(row) else None
+                columnas[col_index].append(None if valor is None else str(valor))
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(columna, pyarrow.string()) for columna in columnas], schema=self._schema
+        ))
+        self._lote.clear()
+
+    def cerrar(self):
+        """Escribe el último lote pendiente y cierra el archivo."""
+        if self._lote or self._writer is None:
+            self._escribir_lote()
+        self._writer.close()
+
+class SalidaParquet:
+    """
+    Salida en formato Parquet, con la misma interfaz que un Workbook de openpyxl en modo
+    `write_only` (`create_sheet`, `sheetnames`, `save`).
+
+    Cada hoja se escribe en su propio archivo '[PREFIJO]_[HOJA].parquet'. En las hojas
+    objetivo el encabezado es la fila anterior a FILA_INICIO_DATOS; en el resto, la fila 1.
+    """
+
+    def __init__(self, ruta_prefijo):
+        self.ruta_prefijo = ruta_prefijo
+        self.archivos = []
+        self._hojas = {}
+
+    @property
+    def sheetnames(self):
+        return list(self._hojas)
+
+    def create_sheet(self, title):
+        """Prepara el archivo Parquet de la hoja y devuelve un objeto con el método `append`."""
+        ruta = f"{self.ruta_prefijo}_{title}.parquet"
+        if title in HOJAS_OBJETIVO:
+            hoja = HojaSalidaParquet(ruta, FILA_INICIO_DATOS - 1, MAX_DEST_COL)
+        else:
+            hoja = HojaSalidaParquet(ruta, 1, 0)
+        self.archivos.append(ruta)
+        self._hojas[title] = hoja
+        return hoja
+
+    def save(self, ruta_absoluta_salida):
+        """
+        Escribe los lotes pendientes y cierra los archivos Parquet. Los nombres de los
+        archivos se fijaron al crear cada hoja; `ruta_absoluta_salida` solo se acepta
+        por compatibilidad con openpyxl.
+        """
+        for hoja in self._hojas.values():
+            hoja.cerrar()
+
+def crear_salida(formato, ruta_absoluta_salida):
+    """
+    Crea el destino de las filas procesadas según el formato de salida elegido.
+
+    Para 'xlsx' se usa XlsxWriter si está instalado y, si no, openpyxl. Todos los
+    destinos ofrecen la interfaz de un Workbook de openpyxl en modo `write_only`:
+    `create_sheet(title)` devuelve una hoja con `append(row)`, y `save(ruta)`
+    termina la escritura.
+
+    :param formato: Uno de FORMATOS_SALIDA.
+    :type formato: str
+    :param ruta_absoluta_salida: Ruta del archivo 'CONSOLIDADO_COMPLETADO.xlsx'. Para
+    'csv' y 'parquet' se usa sin extensión como prefijo de los archivos por hoja.
+    :type ruta_absoluta_salida: str
+    :returns: El libro (o equivalente) de salida.
+    """
+    ruta_prefijo = os.path.splitext(ruta_absoluta_salida)[0]
+    if formato == 'csv':
+        return SalidaCsv(ruta_prefijo)
+    if formato == 'parquet':
+        return SalidaParquet(ruta_prefijo)
+    if xlsxwriter is not None:
+        return SalidaXlsxWriter(ruta_absoluta_salida)
+    # En modo de solo escritura (`write_only=True`) las filas se vuelcan a disco a medida que
+    # se añaden, sin crear objetos Cell ni mantener la hoja en memoria. Este modo no crea
+    # la hoja por defecto 'Sheet', y el libro solo puede guardarse una vez, al final.
+    return openpyxl.Workbook(write_only=True)
+
+def volcar_estados(estados):
+    """
+    Escribe en la consola los mensajes de estado acumulados y vacía la lista.
+
+    :param estados: Los mensajes pendientes, cada uno terminado en salto de línea.
+    :type estados: list
+    """
+    if estados:
+        sys.stdout.write("".join(estados))
+        sys.stdout.flush()
+        estados.clear()
+
+def pausar_salida():
+    """
+    Mantiene la consola abierta hasta que el usuario pulse ENTER.
+
+    Solo espera si la entrada estándar es una terminal interactiva: al ejecutarse
+    desde un programador de tareas, una tubería o un proceso por lotes no hay nadie
+    que pulse ENTER, y `input()` bloquearía (o fallaría sin entrada disponible).
+    """
+    if sys.stdin is not None and sys.stdin.isatty():
+        input("Presiona ENTER para salir...")
+
+def normalizar_codigo(valor_codigo):
+    """
+    Convierte el valor de la celda de código en el texto usado para buscar su archivo.
+
+    :param valor_codigo: El valor de la celda de la columna COL_CODIGO.
+    :type valor_codigo: any
+    :returns: El código sin espacios en los extremos, o "" si la celda está vacía.
+    :rtype: str
+    """
+    # Caso habitual: el código ya es texto y solo hay que recortarlo (`strip` devuelve
+    # el mismo objeto si no hay espacios). Los códigos numéricos no tienen espacios que
+    # recortar, así que basta con `str`.
+    if isinstance(valor_codigo, str):
+        return valor_codigo.strip()
+    return str(valor_codigo) if valor_codigo else ""
+
+def revisar_dimensiones(ws_lectura):
+    """
+    Descarta las dimensiones declaradas de una hoja de solo lectura si no son fiables.
+
+    En modo de solo lectura openpyxl confía en la dimensión guardada en el archivo
+    ('<dimension ref="A1:M500"/>') para saber hasta dónde iterar. Algunas aplicaciones
+    guardan siempre 'A1' aunque la hoja tenga datos, lo que haría que solo se leyera
+    la primera fila. En ese caso se eliminan las dimensiones y la hoja se recorre
+    hasta su última fila real.
+
+    :param ws_lectura: La hoja abierta en modo solo lectura.
+    :type ws_lectura: openpyxl.worksheet._read_only.ReadOnlyWorksheet
+    """
+    if ws_lectura.max_row is not None and ws_lectura.max_row <= 1 and (ws_lectura.max_column or 0) <= 1:
+        ws_lectura.reset_dimensions()
+
+def hojas_objetivo_en_orden(wb_consolidado_lectura):
+    """
+    Devuelve las hojas objetivo presentes en el libro, en el orden en que aparecen en él.
+
+    Recorrer las hojas en el orden del archivo favorece un acceso secuencial al ZIP.
+
+    :param wb_consolidado_lectura: El libro 'CONSOLIDADO.xlsx' abierto en modo solo lectura.
+    :type wb_consolidado_lectura: openpyxl.workbook.workbook.Workbook
+    :returns: Los nombres de las hojas objetivo existentes.
+    :rtype: list
+    """
+    return [nombre for nombre in wb_consolidado_lectura.sheetnames if nombre in HOJAS_OBJETIVO]
+
+def planificar_codigos(wb_consolidado_lectura):
+    """
+    Recorre las hojas objetivo y agrupa las filas que comparten el mismo código.
+
+    Solo se leen los valores de la columna de código, antes de escribir nada, para
+    que cada archivo '[CODIGO].xlsx' se lea una única vez aunque su código aparezca
+    en varias filas o en varias de las hojas 'EDU', 'HOSP', 'EMPRESA'.
+
+    :param wb_consolidado_lectura: El libro 'CONSOLIDADO.xlsx' abierto en modo solo lectura.
+    :type wb_consolidado_lectura: openpyxl.workbook.workbook.Workbook
+    :returns: Un diccionario {código: [(hoja, fila), ...]} en orden de aparición.
+    :rtype: dict
+    """
+    plan = {}
+    for nombre_hoja_objetivo in hojas_objetivo_en_orden(wb_consolidado_lectura):
+        ws_lectura = wb_consolidado_lectura[nombre_hoja_objetivo]
+        # Solo se lee la columna de código: el analizador no construye el resto de cada fila.
+        filas = ws_lectura.iter_rows(
+            min_row=FILA_INICIO_DATOS, min_col=COL_CODIGO, max_col=COL_CODIGO, values_only=True
+        )
+        for fila, (valor_codigo,) in enumerate(filas, start=FILA_INICIO_DATOS):
+            codigo = normalizar_codigo(valor_codigo)
+            if codigo:
+                plan.setdefault(codigo, []).append((nombre_hoja_objetivo, fila))
+    return plan
+
+async def leer_archivos_async(rutas_archivos_origen):
+    """
+    Lee los archivos '[CODIGO].xlsx' en hilos, solapando sus esperas de disco o de red.
+
+    Cada lectura se ejecuta con `asyncio.to_thread` y un semáforo limita las lecturas
+    simultáneas a LECTURAS_SIMULTANEAS. En unidades de red (SMB/NFS) el tiempo de
+    apertura de cada archivo queda oculto tras el análisis de los demás.
+
+    :param rutas_archivos_origen: Las rutas de los archivos a leer.
+    :type rutas_archivos_origen: list
+    :returns: Una tupla (valores, error) por ruta, en el mismo orden.
+    :rtype: list
+    """
+    semaforo = asyncio.Semaphore(LECTURAS_SIMULTANEAS)
+
+    async def leer(ruta_archivo_origen):
+        async with semaforo:
+            return await asyncio.to_thread(leer_cinco_celdas, ruta_archivo_origen)
+
+    return await asyncio.gather(*(leer(ruta) for ruta in rutas_archivos_origen))
+
+def leer_codigos(plan, codigos_disponibles, directorio_cache, executor):
+    """
+    Obtiene los valores de origen de cada código único del plan.
+
+    Los códigos sin archivo '[CODIGO].xlsx' se omiten. Para el resto se reutilizan
+    los valores de la caché persistente cuando el archivo no ha cambiado, y los
+    demás archivos se leen en paralelo en el pool de procesos (o en hilos con
+    asyncio si no hay pool).
+
+    :param plan: El plan de códigos devuelto por `planificar_codigos`.
+    :type plan: dict
+    :param codigos_disponibles: Diccionario {código normalizado: ruta} de los archivos existentes.
+    :type codigos_disponibles: dict
+    :param directorio_cache: Directorio de la caché persistente, o None si está desactivada.
+    :type directorio_cache: str or None
+    :param executor: El pool de procesos donde se leen los archivos, o None para leerlos con asyncio.
+    :type executor: concurrent.futures.ProcessPoolExecutor or None
+    :returns: Un diccionario {código: (valores, error)} con los códigos cuyo archivo existe.
+    :rtype: dict
+    """
+    lecturas = {}
+    # Rutas pendientes de leer y el código al que corresponde cada una.
+    pendientes = {}
+    for codigo in plan:
+        ruta_archivo_origen = codigos_disponibles.get(os.path.normcase(codigo))
+        if ruta_archivo_origen is None:
+            continue
+        # Si el archivo no ha cambiado desde la última ejecución, se reutilizan sus valores.
+        if directorio_cache is not None:
+            valores = cargar_desde_cache(directorio_cache, ruta_archivo_origen)
+            if valores is not None:
+                lecturas[codigo] = (valores, None)
+                continue
+        pendientes[codigo] = ruta_archivo_origen
+
+    if executor is None:
+        # Lectura con E/S solapada en hilos; `gather` conserva el orden de las rutas.
+        resultados = asyncio.run(leer_archivos_async(list(pendientes.values())))
+    else:
+        # Cada archivo se lee en un proceso del pool; `map` conserva el orden de las rutas.
+        resultados = executor.map(leer_cinco_celdas, pendientes.values(), chunksize=16)
+    for (codigo, ruta_archivo_origen), (valores, error) in zip(pendientes.items(), resultados):
+        lecturas[codigo] = (valores, error)
+        if directorio_cache is not None and error is None:
+            guardar_en_cache(directorio_cache, ruta_archivo_origen, valores)
+    return lecturas
+
+def parsear_argumentos():
+    """
+    Define y procesa los argumentos de la línea de comandos.
+
+    :returns: Los argumentos procesados.
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Completa 'CONSOLIDADO.xlsx' con los datos de los archivos '[CODIGO].xlsx' "
+                    "y genera 'CONSOLIDADO_COMPLETADO.xlsx'."
+    )
+    parser.add_argument(
+        '--output-format', choices=FORMATOS_SALIDA, default='xlsx',
+        help="Formato de salida: 'xlsx' (por defecto) genera 'CONSOLIDADO_COMPLETADO.xlsx'; "
+             "'csv' y 'parquet' generan un archivo por hoja, sin formato de Excel."
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help=f"No usar ni actualizar la caché de valores leídos ('{DIRECTORIO_CACHE}')."
+    )
+    parser.add_argument(
+        '--async-io', action='store_true',
+        help="Leer los archivos '[CODIGO].xlsx' en hilos con E/S solapada en lugar de en un pool "
+             "de procesos. Recomendado cuando los archivos están en una unidad de red."
+    )
+    return parser.parse_args()
+
 def main():
     """
     Función principal que orquesta el proceso de autocompletado y consolidación.
@@ -96,11 +835,15 @@ def main():
     También maneja la copia de hojas no objetivo del archivo original al nuevo
     archivo de salida y proporciona mensajes de depuración y error en la consola.
     """
+    args = parsear_argumentos()
+
     # Nombres de los archivos de entrada y salida
     nombre_archivo_consolidado = 'CONSOLIDADO.xlsx'
     nombre_archivo_salida = 'CONSOLIDADO_COMPLETADO.xlsx'
     # Obtener el directorio de trabajo actual donde se espera que estén todos los archivos.
     ruta_base = os.getcwd()
+    # Directorio de la caché persistente, o None si se ha desactivado con '--no-cache'.
+    directorio_cache = None if args.no_cache else os.path.join(ruta_base, DIRECTORIO_CACHE)
 
     print("Iniciando lectura y carga de datos...")
     print(f"DEBUG: Directorio de trabajo actual: {ruta_base}")
@@ -112,104 +855,136 @@ def main():
     if not os.path.exists(ruta_absoluta_consolidado):
         print(f"El archivo '{nombre_archivo_consolidado}' no fue encontrado en el directorio de trabajo actual.")
         print("Por favor, asegúrate de que esté en la misma carpeta que el ejecutable o el script.")
-        input("Presiona ENTER para salir...") # Mantener la consola abierta para que el usuario pueda leer el error.
+        pausar_salida() # Mantener la consola abierta para que el usuario pueda leer el error.
+        return # Salir del script.
+
+    # Listar una sola vez los archivos '[CODIGO].xlsx' disponibles en el directorio, en lugar de
+    # comprobar la existencia de cada archivo fila a fila (una llamada al sistema por fila,
+    # especialmente costosa en unidades de red).
+    # Clave: código (con las mayúsculas/minúsculas normalizadas según el sistema operativo,
+    # igual que al abrir el archivo). Valor: ruta completa del archivo.
+    codigos_disponibles = {
+        os.path.normcase(entry.name)[:-len('.xlsx')]: entry.path
+        for entry in os.scandir(ruta_base)
+        if entry.is_file() and os.path.normcase(entry.name).endswith('.xlsx')
+    }
+
+    # La salida en Parquet necesita pyarrow: se comprueba antes de empezar a procesar.
+    if args.output_format == 'parquet' and pyarrow is None:
+        print("El formato de salida 'parquet' requiere la librería 'pyarrow' (pip install pyarrow).")
+        pausar_salida()
         return # Salir del script.
 
-    # Crear un nuevo libro de trabajo para almacenar los datos procesados.
-    # Este será el archivo 'CONSOLIDADO_COMPLETADO.xlsx'.
-    wb_salida = openpyxl.Workbook()
-    # Eliminar la hoja por defecto 'Sheet' que openpyxl crea si no hay otras hojas aún.
-    if 'Sheet' in wb_salida.sheetnames and len(wb_salida.sheetnames) == 1:
-        wb_salida.remove(wb_salida['Sheet'])
+    # Crear el destino de los datos procesados: un nuevo libro de trabajo que será el
+    # archivo 'CONSOLIDADO_COMPLETADO.xlsx', o los archivos CSV/Parquet por hoja.
+    ruta_absoluta_salida = os.path.join(ruta_base, nombre_archivo_salida)
+    wb_salida = crear_salida(args.output_format, ruta_absoluta_salida)
 
     # Inicializar la variable del libro de trabajo de lectura a None.
     # Esto es útil para asegurar que wb_consolidado_lectura siempre esté definida
     # y pueda ser cerrada en el bloque 'finally' incluso si la carga falla.
     wb_consolidado_lectura = None
+    # Mensajes de estado por fila pendientes de mostrar en la consola.
+    estados = []
+    # Pool de procesos para leer los archivos '[CODIGO].xlsx' en paralelo; se crea dentro
+    # del bloque 'try' para que un error al crearlo también se reporte con la pausa final.
+    executor = None
     try:
         # --- CARGA DEL ARCHIVO CONSOLIDADO EN MODO DE SOLO LECTURA ---
         # Este es el paso clave para la optimización de memoria.
         # openpyxl leerá el archivo de forma eficiente sin cargar todo en RAM.
         print(f"DEBUG: Cargando '{nombre_archivo_consolidado}' en modo solo lectura...")
-        wb_consolidado_lectura = openpyxl.load_workbook(ruta_absoluta_consolidado, read_only=True)
+        # En CSV y Parquet no hay fórmulas: se leen los valores calculados que Excel guardó
+        # en el archivo (`data_only`), en lugar del texto de las fórmulas o de objetos
+        # ArrayFormula. En .xlsx se conservan las fórmulas.
+        wb_consolidado_lectura = openpyxl.load_workbook(
+            ruta_absoluta_consolidado, read_only=True, data_only=args.output_format != 'xlsx'
+        )
         print("DEBUG: Archivo consolidado cargado en modo solo lectura con éxito.")
+        # Este único manejador de lectura (y su ZIP) se comparte en todas las pasadas.
+        for ws_lectura in wb_consolidado_lectura.worksheets:
+            revisar_dimensiones(ws_lectura)
 
-        # Iterar sobre cada hoja definida en HOJAS_OBJETIVO para su procesamiento.
+        # --- Planificación: códigos únicos de todas las hojas objetivo ---
+        # Se recorren primero los códigos de las tres hojas para leer cada archivo
+        # '[CODIGO].xlsx' una sola vez, aunque el código se repita en varias filas u hojas.
+        plan = planificar_codigos(wb_consolidado_lectura)
+        total_filas = sum(len(ubicaciones) for ubicaciones in plan.values())
+        print(f"DEBUG: {len(plan)} códigos únicos en {total_filas} filas con código.")
+
+        # --- Lectura de los archivos individuales (caché persistente + pool de procesos o hilos) ---
+        # Con '--async-io' no se crea el pool y la lectura se hace en hilos. `max_workers=None`
+        # usa un proceso por núcleo, pero como máximo 61 en Windows (un valor mayor allí
+        # lanza ValueError).
+        if not args.async_io:
+            executor = ProcessPoolExecutor(max_workers=None)
+        lecturas = leer_codigos(plan, codigos_disponibles, directorio_cache, executor)
+
+        # Informar de las hojas objetivo que no existen en el archivo consolidado.
         for nombre_hoja_objetivo in HOJAS_OBJETIVO:
-            # Verificar si la hoja objetivo existe en el archivo consolidado.
             if nombre_hoja_objetivo not in wb_consolidado_lectura.sheetnames:
                 print(f"La hoja '{nombre_hoja_objetivo}' no existe en '{nombre_archivo_consolidado}'. Saltando.")
-                continue # Saltar a la siguiente hoja si no se encuentra.
 
+        # Iterar sobre cada hoja objetivo existente, en el orden en que aparecen en el libro.
+        for nombre_hoja_objetivo in hojas_objetivo_en_orden(wb_consolidado_lectura):
             print(f"\nProcesando hoja: {nombre_hoja_objetivo}")
             # Obtener el objeto de la hoja de lectura en modo solo lectura.
             ws_lectura = wb_consolidado_lectura[nombre_hoja_objetivo]
 
-            # Crear una nueva hoja en el libro de trabajo de salida o seleccionarla si ya existe.
-            if nombre_hoja_objetivo in wb_salida.sheetnames:
-                ws_salida = wb_salida[nombre_hoja_objetivo]
-            else:
-                ws_salida = wb_salida.create_sheet(title=nombre_hoja_objetivo)
-
-            # Iterar sobre las filas de la hoja original desde la primera fila (min_row=1).
-            # `values_only=False` es importante para acceder a los objetos Cell y no solo a sus valores,
-            # lo que permite acceder a `cell.value` y `cell.column`.
-            for r_idx, row_data in enumerate(ws_lectura.iter_rows(min_row=1, values_only=False)):
-                # Convertir la fila de objetos Cell a una lista de sus valores.
-                # Esta lista representará la fila que se escribirá en el nuevo archivo.
-                current_row_values = [cell.value for cell in row_data]
-                
-                # Las filas antes de FILA_INICIO_DATOS se consideran encabezados.
-                # Se copian directamente al nuevo archivo sin procesamiento de códigos.
-                if r_idx + 1 < FILA_INICIO_DATOS: # r_idx es 0-indexed, fila es 1-indexed.
-                    ws_salida.append(current_row_values) # Escribir la fila de encabezado directamente.
-                    continue # Pasar a la siguiente fila.
+            # Crear la hoja correspondiente en el libro de salida (una WriteOnlyWorksheet,
+            # que solo admite añadir filas con `append`).
+            ws_salida = wb_salida.create_sheet(title=nombre_hoja_objetivo)
+
+            # --- Escritura de las filas en el libro de salida ---
+            # Las filas antes de FILA_INICIO_DATOS se consideran encabezados.
+            # Se copian directamente al nuevo archivo sin procesamiento de códigos.
+            for row_values in ws_lectura.iter_rows(min_row=1, max_row=FILA_INICIO_DATOS - 1, values_only=True):
+                ws_salida.append(row_values)
 
-                # --- Lógica de procesamiento de datos para filas a partir de FILA_INICIO_DATOS ---
-                # Convertir el índice de fila basado en 0 a un número de fila basado en 1 para los logs.
-                fila_actual_num = r_idx + 1
+            # --- Lógica de procesamiento de datos para filas a partir de FILA_INICIO_DATOS ---
+            # `values_only=True` entrega tuplas de valores sin crear un objeto Cell por celda.
+            filas_datos = ws_lectura.iter_rows(min_row=FILA_INICIO_DATOS, values_only=True)
+            for fila_actual_num, row_values in enumerate(filas_datos, start=FILA_INICIO_DATOS):
+                # Copiar la tupla de valores a una lista, que representará la fila que se
+                # escribirá en el nuevo archivo.
+                current_row_values = list(row_values)
                 
-                # Obtener el objeto Cell de la columna de código (COL_CODIGO) de la fila actual.
-                # Se resta 1 porque `row_data` es una lista 0-indexed.
-                codigo_cell = row_data[COL_CODIGO - 1]
-                # Extraer el valor del código, convertirlo a string y eliminar espacios en blanco.
-                codigo = str(codigo_cell.value).strip() if codigo_cell.value else ""
+                # Extraer el valor del código de la columna COL_CODIGO (se resta 1 porque la
+                # tupla es 0-indexed). Las filas sin celdas pueden llegar vacías o más cortas.
+                codigo = normalizar_codigo(row_values[COL_CODIGO - 1]) if len(row_values) >= COL_CODIGO else ""
                 
                 # Si no se encuentra un código en la celda, la fila se copia tal cual sin buscar un archivo externo.
                 if not codigo:
                     ws_salida.append(current_row_values)
                     continue # Pasar a la siguiente fila.
 
-                # Construir la ruta completa al archivo individual '[CODIGO].xlsx'.
-                ruta_archivo_origen = os.path.join(ruta_base, f"{codigo}.xlsx")
-                
-                # Verificar si el archivo individual existe.
-                if os.path.isfile(ruta_archivo_origen):
-                    try:
-                        # Cargar el libro de trabajo del archivo individual en modo solo datos.
-                        wb_codigo = openpyxl.load_workbook(ruta_archivo_origen, data_only=True)
-                        # Iterar sobre las columnas de destino definidas en COL_INDICES_DESTINO.
-                        for col_index, celda_ref_origen in COL_INDICES_DESTINO.items():
-                            # Cargar el valor de la celda de origen del archivo individual.
-                            valor = cargar_valor_desde_origen(wb_codigo, celda_ref_origen)
-                            # Asegurarse de que la lista 'current_row_values' tenga suficientes elementos
-                            # para la columna de destino. Si es más corta, se rellena con None.
-                            while len(current_row_values) < col_index:
-                                current_row_values.append(None)
-                            # Actualizar el valor en la posición correcta de la lista de la fila.
-                            # Se resta 1 porque 'col_index' es 1-indexed y la lista es 0-indexed.
-                            current_row_values[col_index - 1] = valor
-                        print(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Copiado")
-                    except Exception as e:
+                # Verificar si el archivo individual existe: solo esos códigos tienen una lectura.
+                if codigo in lecturas:
+                    valores, error = lecturas[codigo]
+                    if error is None:
+                        # Asegurarse de que la lista 'current_row_values' llegue hasta la última columna
+                        # de destino. Si es más corta, se rellena con None de una sola vez.
+                        if len(current_row_values) < MAX_DEST_COL:
+                            current_row_values.extend([None] * (MAX_DEST_COL - len(current_row_values)))
+                        # Actualizar los valores en las posiciones (0-indexed) de las columnas de destino.
+                        for posicion, valor in zip(DEST_APPLY, valores):
+                            current_row_values[posicion] = valor
+                        estados.append(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Copiado\n")
+                    else:
                         # Reportar errores específicos al leer el archivo individual.
-                        print(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Error al leer -> {e}")
+                        estados.append(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Error al leer -> {error}\n")
                 else:
                     # Reportar si el archivo individual no fue encontrado.
-                    print(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Archivo no encontrado")
+                    estados.append(f"  • Fila {fila_actual_num:>4} | Código: {codigo:<10} | Estado: Archivo no encontrado\n")
                 
                 # Añadir la fila (ya sea modificada o copiada tal cual) a la hoja de salida.
                 ws_salida.append(current_row_values)
 
+                # Volcar los mensajes de estado a la consola por bloques, no fila a fila.
+                if len(estados) >= LINEAS_POR_VOLCADO:
+                    volcar_estados(estados)
+
+            volcar_estados(estados)
             print(f"Fin de hoja '{nombre_hoja_objetivo}'")
         
         # --- Copia de Hojas No Procesadas ---
@@ -224,10 +999,14 @@ def main():
                 # Crear una nueva hoja con el mismo nombre en el libro de salida.
                 ws_nueva = wb_salida.create_sheet(title=existing_sheet_name)
                 # Copiar todas las filas de la hoja original a la nueva hoja de salida.
-                for row in ws_original.iter_rows(values_only=True):
+                # `values` entrega directamente las tuplas de valores del lector en streaming y
+                # la hoja de solo escritura las vuelca a disco, sin crear objetos Cell en ningún lado.
+                for row in ws_original.values:
                     ws_nueva.append(row)
 
     except Exception as e:
+        # Mostrar los mensajes de estado pendientes antes del error.
+        volcar_estados(estados)
         # --- Manejo de ERRORES CRÍTICOS DURANTE EL PROCESAMIENTO ---
         print(f"ERROR CRÍTICO durante el procesamiento: {e}")
         print("\n--- INICIO DE TRACEBACK DETALLADO ---")
@@ -235,7 +1014,7 @@ def main():
         traceback.print_exc()
         print("--- FIN DE TRACEBACK DETALLADO ---\n")
         print("Esto podría deberse a un archivo Excel corrupto, problemas de permisos, o un problema inesperado.")
-        input("Presiona ENTER para salir...")
+        pausar_salida()
         sys.exit(1) # Salir del script con un código de error.
     finally:
         # --- Cierre de Archivo de Lectura ---
@@ -243,25 +1022,30 @@ def main():
         # se cierre, incluso si ocurre una excepción, liberando recursos.
         if wb_consolidado_lectura is not None:
             wb_consolidado_lectura.close()
+        # Detener los procesos del pool.
+        if executor is not None:
+            executor.shutdown()
 
 
     # --- Guarda el Nuevo Libro de Trabajo ---
-    ruta_absoluta_salida = os.path.join(ruta_base, nombre_archivo_salida)
     try:
-        # Intentar guardar el libro de trabajo de salida.
+        # Intentar guardar el libro de trabajo de salida (o cerrar los archivos CSV/Parquet).
         wb_salida.save(ruta_absoluta_salida)
-        print(f"\nArchivo modificado guardado como '{os.path.basename(ruta_absoluta_salida)}'")
+        for ruta_generada in getattr(wb_salida, 'archivos', [ruta_absoluta_salida]):
+            print(f"\nArchivo modificado guardado como '{os.path.basename(ruta_generada)}'")
     except Exception as e:
         # Capturar y reportar errores durante el proceso de guardado.
         print(f"Error al guardar el archivo '{os.path.basename(ruta_absoluta_salida)}': {e}")
         print("Asegúrate de que el archivo no esté abierto en otra aplicación o que tengas permisos de escritura.")
-        input("Presiona ENTER para salir...")
+        pausar_salida()
         sys.exit(1) # Salir del script con un código de error.
 
     print("\n El proceso ha terminado correctamente.")
-    input("Presiona ENTER para salir...") # Pausar la consola al finalizar.
+    pausar_salida() # Pausar la consola al finalizar.
 
 # Punto de entrada del script. Asegura que `main()` se ejecute solo cuando el script
 # es ejecutado directamente y no cuando es importado como un módulo.
 if __name__ == '__main__':
+    # Necesario para que los procesos del pool funcionen en el ejecutable de PyInstaller (Windows).
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -5,7 +5,9 @@ Este script lee un archivo Excel llamado 'CONSOLIDADO.xlsx', busca códigos
 en la Columna D de hojas específicas ('EDU', 'HOSP', 'EMPRESA'), y utiliza
 esos códigos para generar fórmulas de enlace a archivos Excel externos.
 
-Al finalizar, el script guarda el archivo modificado con un nuevo nombre,
+El archivo maestro se lee en modo de solo lectura y el resultado se escribe
+fila a fila en un libro nuevo en modo de solo escritura, sin cargar nunca el
+libro completo en memoria. El resultado se guarda con un nuevo nombre,
 'CONSOLIDADO_COMPLETADO.xlsx'.
 
 NOTA IMPORTANTE:
@@ -18,8 +20,43 @@ los archivos si están en esa ubicación exacta.
 `NOMBRE_HOJA_ORIGEN_FIJO`.
 """
 
+import bisect
+import contextlib
+import functools
+import multiprocessing
 import openpyxl
 import os
+import posixpath
+import re
+import shutil
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl.formula.translate import Translator
+from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+
+# python-calamine (lector en Rust) es opcional: si está instalado se usa para leer los códigos
+# de la columna D, mucho más rápido que openpyxl. Si no está disponible, se usa openpyxl.
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# lxml es opcional: si está instalado, el archivo de salida se genera copiando 'CONSOLIDADO.xlsx'
+# y modificando solo el XML de las hojas objetivo, lo que conserva estilos y formato. Si no
+# está disponible, el libro se reescribe fila a fila (solo valores y fórmulas).
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# XlsxWriter es opcional: si está instalado se usa para escribir 'CONSOLIDADO_COMPLETADO.xlsx',
+# más rápido que openpyxl. Si no está disponible, se usa openpyxl en modo de solo escritura.
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
 
 # --- Constantes de Configuración ---
 
@@ -39,6 +76,17 @@ COLUMNAS_DESTINO = {
     "M": "$N$161",
 }
 
+# Plan de escritura de cada fila de datos: (índice de columna, letra de columna) de cada
+# columna de destino, en el mismo orden que las fórmulas de `formulas_codigo`. Es una tupla
+# fija que se recorre en secuencia en cada fila, sin iterar el diccionario.
+PLAN_ESCRITURA = tuple(
+    (openpyxl.utils.column_index_from_string(col_letra), col_letra)
+    for col_letra in COLUMNAS_DESTINO
+)
+
+# Columna de destino más alta: longitud mínima que debe tener una fila para recibir las fórmulas.
+MAX_DEST_COL = max(col_index for col_index, _ in PLAN_ESCRITURA)
+
 # Lista de nombres de las hojas del archivo 'CONSOLIDADO.xlsx' que el script debe procesar.
 HOJAS_OBJETIVO = ["EDU", "HOSP", "EMPRESA"]
 
@@ -50,6 +98,67 @@ NOMBRE_HOJA_ORIGEN_FIJO = "Hoja1" # Nombre de la hoja en los archivos '[CODIGO].
 
 RUTA_ARCHIVOS_ORIGEN = r"C:\presupuestos" # Ruta absoluta fija donde se encuentran los archivos '[CODIGO].xlsx'
 
+# Directorio de origen en la forma que espera la fórmula de Excel: ruta terminada en un único
+# separador (ej. 'C:\presupuestos\'). RUTA_ARCHIVOS_ORIGEN ya es absoluta, así que basta con
+# concatenar el separador (sin `os.path.abspath`, que en Windows es una llamada al sistema).
+PATH_PREFIX = RUTA_ARCHIVOS_ORIGEN.rstrip(os.sep) + os.sep
+
+# Partes fijas de las fórmulas de enlace externo.
+# Formato: ='C:\Ruta\Al\Directorio\[NombreArchivo.xlsx]NombreHoja'!$Celda
+# Cada fórmula se construye concatenando PREFIJO_FORMULA + código + SUFIJO_ENLACE (una vez por
+# código) y la celda de origen de cada columna, sin interpretar una plantilla en cada fila.
+PREFIJO_FORMULA = "='" + PATH_PREFIX + "["
+SUFIJO_ENLACE = ".xlsx]" + NOMBRE_HOJA_ORIGEN_FIJO + "'!"
+
+# Celdas de origen de cada columna de destino, en el mismo orden que PLAN_ESCRITURA.
+CELDAS_ORIGEN = tuple(COLUMNAS_DESTINO.values())
+
+# Espacios de nombres y etiquetas XML del formato OOXML (.xlsx) necesarios para modificar
+# directamente el XML de las hojas.
+NS_HOJA = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL_DOCUMENTO = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_REL_PAQUETE = "http://schemas.openxmlformats.org/package/2006/relationships"
+TAG_DATOS_HOJA = f"{{{NS_HOJA}}}sheetData"
+TAG_FILA = f"{{{NS_HOJA}}}row"
+TAG_CELDA = f"{{{NS_HOJA}}}c"
+TAG_DIMENSION = f"{{{NS_HOJA}}}dimension"
+TAG_FORMULA = f"{{{NS_HOJA}}}f"
+TAG_CALCULO = f"{{{NS_HOJA}}}calcPr"
+
+# Declaraciones de espacios de nombres al comienzo de la etiqueta de apertura de un elemento
+# serializado (ej. '<row xmlns="..." xmlns:x14ac="..." r="1">').
+PATRON_DECLARACIONES_NS = re.compile(rb'^(<[^\s>/]+)((?:\s+xmlns(?::[^\s=]+)?="[^"]*")+)')
+PATRON_DECLARACION_NS = re.compile(rb'\s+xmlns(?::[^\s=]+)?="[^"]*"')
+
+# Elementos de 'xl/workbook.xml' que el esquema sitúa detrás de <calcPr>.
+ELEMENTOS_TRAS_CALCULO = frozenset(
+    f"{{{NS_HOJA}}}{nombre}"
+    for nombre in (
+        "oleSize", "customWorkbookViews", "pivotCaches", "smartTagPr", "smartTagTypes",
+        "webPublishing", "fileRecoveryPr", "webPublishObjects", "extLst",
+    )
+)
+
+# Fórmulas ya construidas para cada código: {código: (fórmula por columna de destino, ...)}.
+# Un código que se repite en varias filas u hojas solo se formatea la primera vez. Solo se
+# usa en el proceso principal (ver `calcular_formulas_hoja`).
+_FORMULA_CACHE = {}
+
+# Modo de cálculo del libro de salida. En modo manual, Excel no recalcula al abrir el archivo
+# los miles de enlaces a archivos externos (que pueden no estar accesibles); el usuario
+# recalcula cuando lo necesite (F9).
+MODO_CALCULO = "manual"
+
+# Mostrar un mensaje de estado por cada fila procesada. Se puede desactivar con la variable
+# de entorno CONSOLIDADO_VERBOSE=0 para acelerar el proceso en hojas muy grandes. Se ignoran
+# los espacios alrededor del valor (`set CONSOLIDADO_VERBOSE=0 && ...` en cmd deja "0 ").
+VERBOSE = os.environ.get("CONSOLIDADO_VERBOSE", "1").strip() != "0"
+
+# Esperar a que el usuario pulse ENTER antes de salir. Se puede desactivar con la variable
+# de entorno CONSOLIDADO_NOPAUSE=1 (ejecuciones programadas o por lotes). Como en VERBOSE,
+# se ignoran los espacios alrededor del valor.
+PAUSAR_AL_SALIR = os.environ.get("CONSOLIDADO_NOPAUSE", "").strip() != "1"
+
 # --- Funciones Auxiliares (cargar_valor ya no es estrictamente necesaria aquí, pero se mantiene) ---
 
 
@@ -69,90 +178,751 @@ def cargar_valor(wb, celda):
         return None
 
 
-def procesar_hoja(ws):
+class HojaSalidaXlsxWriter:
+    """
+    Hoja de una SalidaXlsxWriter: escribe cada fila añadida a continuación de la anterior.
     """
-    Procesa una hoja específica del archivo 'CONSOLIDADO.xlsx' insertando fórmulas
-    de enlace externo a los archivos '[CODIGO].xlsx'.
 
-    Itera a través de las filas de la hoja, extrayendo un código de la
-    COL_CODIGO (Columna D). Utiliza este código para construir una
-    fórmula de enlace externo con la ruta ABSOLUTA FIJA.
-    Los mensajes de estado se imprimen en la consola.
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+        self._fila = 0
+
+    def append(self, row):
+        """Escribe una fila de valores en la siguiente fila de la hoja (None deja la celda vacía)."""
+        try:
+            self._worksheet.write_row(self._fila, 0, row)
+        except TypeError:
+            # La fila contiene fórmulas matriciales o tablas de datos (objetos de openpyxl
+            # que `write_row` no admite): se reescribe celda a celda.
+            self._escribir_celdas(row)
+        self._fila += 1
+
+    def _escribir_celdas(self, row):
+        """Escribe una fila celda a celda, convirtiendo las fórmulas especiales de openpyxl."""
+        for col_index, valor in enumerate(row):
+            if isinstance(valor, ArrayFormula):
+                # La fórmula matricial ocupa el mismo rango que en el archivo original.
+                min_col, min_fila, max_col, max_fila = openpyxl.utils.cell.range_boundaries(valor.ref)
+                self._worksheet.write_array_formula(
+                    min_fila - 1, min_col - 1, max_fila - 1, max_col - 1, valor.text or ""
+                )
+            elif isinstance(valor, DataTableFormula):
+                # XlsxWriter no puede crear tablas de datos: se deja el texto que muestra Excel.
+                self._worksheet.write_string(
+                    self._fila, col_index, f"{{=TABLE({valor.r1 or ''},{valor.r2 or ''})}}"
+                )
+            else:
+                self._worksheet.write(self._fila, col_index, valor)
+
+
+class SalidaXlsxWriter:
+    """
+    Salida .xlsx escrita con XlsxWriter, con la misma interfaz que un Workbook de openpyxl
+    en modo `write_only` (`create_sheet`, `save`).
+
+    Con `constant_memory` cada fila se vuelca a disco en cuanto se pasa a la siguiente,
+    de modo que la memoria no crece con el tamaño de la hoja. Como en openpyxl, los
+    textos que empiezan por '=' (las fórmulas de enlace y las fórmulas copiadas) se
+    escriben como fórmulas y los textos con forma de URL, como texto (no como hipervínculos).
+    """
 
-    :param ws: El objeto Worksheet de openpyxl de la hoja a procesar.
-    :type ws: openpyxl.worksheet.worksheet.Worksheet
-    """
-    fila = FILA_INICIO
-    # Bucle infinito que se rompe cuando no se encuentra un código en la fila actual
-    while True:
-        # Obtener el valor de la celda en la columna del código para la fila actual
-        codigo = ws.cell(row=fila, column=COL_CODIGO).value
-        if not codigo:
-            # Si la celda de código está vacía, se asume que no hay más datos y se sale del bucle
-            break
-
-        # Limpiar el código (convertir a string y eliminar espacios en blanco)
-        codigo = str(codigo).strip()
-        # Construir el nombre del archivo individual
-        nombre_archivo_codigo = f"{codigo}.xlsx"
-
-        # OBTENER LA RUTA ABSOLUTA COMPLETA AL ARCHIVO DE ORIGEN USANDO LA CONSTANTE FIJA
-        ruta_absoluta_archivo_codigo = os.path.abspath(
-            os.path.join(RUTA_ARCHIVOS_ORIGEN, nombre_archivo_codigo)
+    def __init__(self, archivo_salida):
+        self._workbook = xlsxwriter.Workbook(
+            archivo_salida,
+            {
+                "constant_memory": True,
+                "strings_to_formulas": True,
+                "strings_to_urls": False,
+                "default_date_format": "yyyy-mm-dd h:mm:ss",
+            },
         )
+        # En modo manual XlsxWriter escribe además calcOnSave="0" y no fuerza el recálculo al abrir.
+        self._workbook.set_calc_mode(MODO_CALCULO)
+
+    def create_sheet(self, title):
+        """Añade una hoja al libro y devuelve un objeto con el método `append`."""
+        return HojaSalidaXlsxWriter(self._workbook.add_worksheet(title))
+
+    def save(self, archivo_salida):
+        """
+        Termina de escribir el libro. La ruta se fijó al crear la salida;
+        `archivo_salida` solo se acepta por compatibilidad con openpyxl.
+        """
+        self._workbook.close()
+
+
+def crear_libro_salida(archivo_salida):
+    """
+    Crea el libro de salida donde se escriben las filas procesadas.
+
+    Se usa XlsxWriter si está instalado y, si no, un Workbook de openpyxl en modo
+    `write_only`. En ambos casos el libro se guarda con el modo de cálculo
+    MODO_CALCULO. Ambos ofrecen la misma interfaz: `create_sheet(title)` devuelve
+    una hoja con `append(row)`, y `save(ruta)` termina la escritura.
+
+    :param archivo_salida: La ruta del archivo 'CONSOLIDADO_COMPLETADO.xlsx'.
+    :type archivo_salida: str
+    :returns: El libro de salida.
+    """
+    if xlsxwriter is not None:
+        return SalidaXlsxWriter(archivo_salida)
+    # En modo de solo escritura las filas se vuelcan a disco a medida que se añaden.
+    # Este modo no crea la hoja por defecto 'Sheet'.
+    wb_salida = openpyxl.Workbook(write_only=True)
+    # Sin recálculo al abrir ni al guardar en Excel.
+    wb_salida.calculation.calcMode = MODO_CALCULO
+    wb_salida.calculation.calcOnSave = False
+    wb_salida.calculation.fullCalcOnLoad = False
+    return wb_salida
+
+
+def listar_archivos_origen():
+    """
+    Lista una sola vez los archivos '.xlsx' existentes en RUTA_ARCHIVOS_ORIGEN.
+
+    Sustituye una comprobación de existencia (una llamada al sistema) por fila, muy
+    costosa cuando el directorio está en una unidad de red, por una única lectura
+    del directorio. Los nombres se normalizan con `os.path.normcase` (en Windows,
+    en minúsculas) para compararlos igual que lo haría el sistema de archivos.
+
+    :returns: Los nombres normalizados de los archivos '.xlsx' del directorio de origen,
+    o un conjunto vacío si el directorio no existe o no es accesible.
+    :rtype: set
+    """
+    try:
+        with os.scandir(RUTA_ARCHIVOS_ORIGEN) as entradas:
+            return {
+                os.path.normcase(entrada.name)
+                for entrada in entradas
+                if entrada.is_file() and os.path.normcase(entrada.name).endswith(".xlsx")
+            }
+    except OSError:
+        return set()
+
+
+def formulas_codigo(codigo):
+    """
+    Devuelve las fórmulas de enlace externo de un código, una por columna de destino.
+
+    Las fórmulas se construyen por concatenación la primera vez que aparece el código
+    (la parte común hasta el '!' una sola vez) y se guardan en _FORMULA_CACHE para las
+    siguientes.
+
+    :param codigo: El código ya normalizado.
+    :type codigo: str
+    :returns: Las fórmulas, en el mismo orden que CELDAS_ORIGEN.
+    :rtype: tuple
+    """
+    formulas = _FORMULA_CACHE.get(codigo)
+    if formulas is None:
+        enlace = PREFIJO_FORMULA + codigo + SUFIJO_ENLACE
+        formulas = tuple([enlace + celda_origen for celda_origen in CELDAS_ORIGEN])
+        _FORMULA_CACHE[codigo] = formulas
+    return formulas
+
+
+def normalizar_valor_calamine(valor):
+    """
+    Adapta un valor devuelto por python-calamine al tipo que devolvería openpyxl.
+
+    python-calamine representa las celdas vacías como cadena vacía y todos los
+    números como float; openpyxl devuelve None y enteros cuando el valor es entero
+    (así el código 101 da el archivo '101.xlsx' y no '101.0.xlsx').
+
+    :param valor: El valor leído por python-calamine.
+    :type valor: any
+    :returns: El valor equivalente al que devolvería openpyxl.
+    :rtype: any or None
+    """
+    if valor == "":
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def leer_codigos_calamine(ruta_consolidado, hoja):
+    """
+    Lee con python-calamine los códigos de la COL_CODIGO de una hoja, desde FILA_INICIO
+    hasta la primera celda vacía.
+
+    :param ruta_consolidado: La ruta de 'CONSOLIDADO.xlsx'.
+    :type ruta_consolidado: str
+    :param hoja: El nombre de la hoja.
+    :type hoja: str
+    :returns: Los valores de los códigos, en orden de fila.
+    :rtype: list
+    """
+    wb_calamine = CalamineWorkbook.from_path(ruta_consolidado)
+    try:
+        ws_calamine = wb_calamine.get_sheet_by_name(hoja)
+        # Con `skip_empty_area=False` las filas empiezan en la fila 1 y en la columna A,
+        # aunque la hoja tenga filas o columnas vacías al principio.
+        filas = ws_calamine.to_python(skip_empty_area=False)
+        codigos = []
+        for valores_fila in filas[FILA_INICIO - 1:]:
+            codigo = normalizar_valor_calamine(valores_fila[COL_CODIGO - 1]) if len(valores_fila) >= COL_CODIGO else None
+            if not codigo:
+                # Si la celda de código está vacía, se asume que no hay más datos
+                break
+            codigos.append(codigo)
+        return codigos
+    finally:
+        wb_calamine.close()
+
+
+def leer_codigos_hoja(ruta_consolidado, hoja):
+    """
+    Lee los códigos de la COL_CODIGO (Columna D) de una hoja, desde FILA_INICIO hasta
+    la primera celda vacía.
+
+    Se usa python-calamine si está instalado; si no (o si falla), openpyxl en modo
+    solo lectura recorriendo solo la columna del código. Ambos lectores devuelven el
+    valor calculado de las celdas: un código obtenido con una fórmula vale el último
+    resultado guardado por Excel, no el texto de la fórmula (python-calamine no puede
+    leer el texto de las fórmulas).
+
+    :param ruta_consolidado: La ruta de 'CONSOLIDADO.xlsx'.
+    :type ruta_consolidado: str
+    :param hoja: El nombre de la hoja.
+    :type hoja: str
+    :returns: Los valores de los códigos, en orden de fila.
+    :rtype: list
+    """
+    if CalamineWorkbook is not None:
+        try:
+            return leer_codigos_calamine(ruta_consolidado, hoja)
+        except Exception:
+            pass  # Se recurre a openpyxl.
+
+    # `data_only=True` para leer los mismos valores que python-calamine (ver arriba).
+    wb_lectura = openpyxl.load_workbook(ruta_consolidado, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws_lectura = wb_lectura[hoja]
+        # No fiarse de la dimensión declarada en el archivo (ver `main`).
+        ws_lectura.reset_dimensions()
+        codigos = []
+        for (codigo,) in ws_lectura.iter_rows(
+            min_row=FILA_INICIO, min_col=COL_CODIGO, max_col=COL_CODIGO, values_only=True
+        ):
+            if not codigo:
+                # Si la celda de código está vacía, se asume que no hay más datos
+                break
+            codigos.append(codigo)
+        return codigos
+    finally:
+        wb_lectura.close()
+
 
-        # Extraer el directorio y el nombre del archivo base para la fórmula de Excel
-        directorio_origen = os.path.dirname(ruta_absoluta_archivo_codigo)
-        nombre_archivo_base = os.path.basename(ruta_absoluta_archivo_codigo)
+def leer_filas_codigo(ruta_consolidado, hoja):
+    """
+    Lee los códigos normalizados de las filas de datos de una hoja de 'CONSOLIDADO.xlsx'.
 
-        # Asegurar que el directorio termine con un separador de ruta para la sintaxis de Excel.
-        path_para_formula = directorio_origen
-        if directorio_origen and not directorio_origen.endswith(os.sep):
-            path_para_formula += os.sep
+    Se ejecuta en un proceso del pool, uno por hoja objetivo. Las fórmulas no se
+    construyen aquí sino en el proceso principal (ver `calcular_formulas_hoja`).
 
+    :param ruta_consolidado: La ruta absoluta de 'CONSOLIDADO.xlsx'.
+    :type ruta_consolidado: str
+    :param hoja: El nombre de la hoja objetivo.
+    :type hoja: str
+    :returns: Una tupla (fila, código) por fila de datos, en orden.
+    :rtype: list
+    """
+    resultado = []
+    for fila, codigo in enumerate(leer_codigos_hoja(ruta_consolidado, hoja), start=FILA_INICIO):
+        # Limpiar el código: los textos solo necesitan quitar espacios en blanco (`strip`
+        # devuelve la misma cadena si no hay nada que quitar); los números (int/float) solo
+        # necesitan convertirse a string, que no tendrá espacios.
+        codigo = codigo.strip() if isinstance(codigo, str) else str(codigo)
+        resultado.append((fila, codigo))
+    return resultado
+
+
+def calcular_formulas_hoja(filas_codigo):
+    """
+    Construye las fórmulas de las filas de datos de una hoja objetivo.
+
+    Se ejecuta en el proceso principal, después de reunir los códigos de todas las
+    hojas, para que _FORMULA_CACHE se comparta entre ellas: un código repetido en
+    'EDU', 'HOSP' y 'EMPRESA' solo se formatea una vez y sus filas comparten las
+    mismas cadenas.
+
+    :param filas_codigo: Las tuplas (fila, código) devueltas por `leer_filas_codigo`.
+    :type filas_codigo: list
+    :returns: Una tupla (fila, código, fórmulas) por fila de datos, en orden.
+    :rtype: list
+    """
+    return [(fila, codigo, formulas_codigo(codigo)) for fila, codigo in filas_codigo]
+
+
+def escribir_registro(formulas_hoja, archivos_existentes):
+    """
+    Escribe en la consola, de una vez, los mensajes de estado de las filas de una hoja.
+
+    :param formulas_hoja: Las tuplas (fila, código, fórmulas) de la hoja.
+    :type formulas_hoja: list
+    :param archivos_existentes: Los nombres normalizados de los archivos del directorio
+    de origen, devueltos por `listar_archivos_origen`.
+    :type archivos_existentes: set
+    """
+    if not VERBOSE:
+        return
+    registro = []
+    for fila, codigo, _ in formulas_hoja:
         # Opcional: Verificar si el archivo existe para dar un mensaje informativo
-        archivo_existe = os.path.isfile(ruta_absoluta_archivo_codigo)
-
-        # Iterar sobre las columnas de destino y sus celdas de origen correspondientes
-        for col_letra, celda_origen_ref in COLUMNAS_DESTINO.items():
-            # Construir la fórmula de enlace externo con la RUTA ABSOLUTA FIJA
-            # Formato: ='C:\Ruta\Al\Directorio\[NombreArchivo.xlsx]NombreHoja'!$Celda
-            formula_enlace = f"='{path_para_formula}[{nombre_archivo_base}]{NOMBRE_HOJA_ORIGEN_FIJO}'!{celda_origen_ref}"
-
-            # Convertir la letra de la columna a su índice numérico (ej. 'F' -> 6)
-            col_index = openpyxl.utils.column_index_from_string(col_letra)
-            # Escribir la FÓRMULA en la celda de destino
-            ws.cell(row=fila, column=col_index, value=formula_enlace)
-
-        if archivo_existe:
-            print(
-                f"  • Fila {fila:>4} | Código: {codigo:<10} | Estado: Fórmula ABSOLUTA añadida"
+        if os.path.normcase(f"{codigo}.xlsx") in archivos_existentes:
+            registro.append(
+                f"  • Fila {fila:>4} | Código: {codigo:<10} | Estado: Fórmula ABSOLUTA añadida\n"
             )
         else:
             # Advertencia si el archivo no existe, aunque la fórmula se añade
-            print(
-                f"  • Fila {fila:>4} | Código: {codigo:<10} | Estado: Archivo de origen no encontrado, se añadió fórmula ABSOLUTA."
+            registro.append(
+                f"  • Fila {fila:>4} | Código: {codigo:<10} | Estado: Archivo de origen no encontrado, se añadió fórmula ABSOLUTA.\n"
             )
+    if registro:
+        sys.stdout.write("".join(registro))
+        sys.stdout.flush()
+
+
+def procesar_hoja(ws_lectura, ws_salida, formulas_hoja, archivos_existentes):
+    """
+    Escribe una hoja específica del archivo 'CONSOLIDADO.xlsx' en la salida insertando
+    las fórmulas de enlace externo a los archivos '[CODIGO].xlsx'.
+
+    Recorre las filas de la hoja de lectura una sola vez y escribe cada una en la
+    hoja de salida. Las filas de datos reciben en las columnas de destino las
+    fórmulas calculadas por `calcular_formulas_hoja`; el resto de filas (a partir
+    de la primera fila sin código) se copia sin cambios.
+    Los mensajes de estado se imprimen en la consola.
+
+    :param ws_lectura: La hoja de 'CONSOLIDADO.xlsx' abierta en modo solo lectura.
+    :type ws_lectura: openpyxl.worksheet._read_only.ReadOnlyWorksheet
+    :param ws_salida: La hoja correspondiente del libro de salida (solo escritura).
+    :type ws_salida: openpyxl.worksheet._write_only.WriteOnlyWorksheet
+    :param formulas_hoja: Las tuplas (fila, código, fórmulas) de la hoja.
+    :type formulas_hoja: list
+    :param archivos_existentes: Los nombres normalizados de los archivos del directorio
+    de origen, devueltos por `listar_archivos_origen`.
+    :type archivos_existentes: set
+    """
+    # Copiar las filas de encabezado (anteriores a FILA_INICIO) sin cambios.
+    for valores_fila in ws_lectura.iter_rows(max_row=FILA_INICIO - 1, values_only=True):
+        ws_salida.append(valores_fila)
+
+    # Recorrer las filas de datos como tuplas de valores (`values_only`), sin crear objetos Cell.
+    # `formulas_hoja` va primero en `zip` para no consumir la fila siguiente a la última con código.
+    filas_datos = ws_lectura.iter_rows(min_row=FILA_INICIO, values_only=True)
+    for (_, _, formulas), valores_fila in zip(formulas_hoja, filas_datos):
+        # Solo las filas que reciben fórmulas se convierten en lista
+        valores_fila = list(valores_fila)
+
+        # Completar la fila con celdas vacías si es más corta que la última columna de destino
+        if len(valores_fila) < MAX_DEST_COL:
+            valores_fila.extend([None] * (MAX_DEST_COL - len(valores_fila)))
+
+        # Escribir en cada columna de destino su fórmula con la RUTA ABSOLUTA FIJA
+        for (col_index, _), formula in zip(PLAN_ESCRITURA, formulas):
+            valores_fila[col_index - 1] = formula
+
+        # Escribir la fila completa en la hoja de salida
+        ws_salida.append(valores_fila)
 
-        fila += 1  # Avanzar a la siguiente fila
+    # La primera fila sin código y las siguientes se copian sin cambios.
+    for valores_fila in filas_datos:
+        ws_salida.append(valores_fila)
+
+    escribir_registro(formulas_hoja, archivos_existentes)
+
+
+def localizar_hojas_libro(ruta_consolidado):
+    """
+    Localiza dentro de 'CONSOLIDADO.xlsx' la parte XML de cada hoja.
+
+    Lee 'xl/workbook.xml' (nombres de las hojas) y 'xl/_rels/workbook.xml.rels'
+    (ruta de cada hoja dentro del ZIP).
+
+    :param ruta_consolidado: La ruta de 'CONSOLIDADO.xlsx'.
+    :type ruta_consolidado: str
+    :returns: Un diccionario {ruta de la parte dentro del ZIP: nombre de la hoja}.
+    :rtype: dict
+    :raises ValueError: Si el libro no usa el formato OOXML habitual.
+    :raises KeyError: Si falta alguna de las partes necesarias.
+    """
+    with zipfile.ZipFile(ruta_consolidado) as zip_libro:
+        libro = ET.fromstring(zip_libro.read("xl/workbook.xml"))
+        relaciones = ET.fromstring(zip_libro.read("xl/_rels/workbook.xml.rels"))
+    if libro.tag != f"{{{NS_HOJA}}}workbook":
+        raise ValueError(f"Formato de libro no soportado: {libro.tag}")
+
+    destinos = {}
+    for relacion in relaciones.iter(f"{{{NS_REL_PAQUETE}}}Relationship"):
+        destino = relacion.get("Target", "")
+        # Los destinos son relativos a 'xl/' salvo que empiecen por '/'.
+        if destino.startswith("/"):
+            destino = destino.lstrip("/")
+        else:
+            destino = posixpath.normpath(posixpath.join("xl", destino))
+        destinos[relacion.get("Id")] = destino
+
+    return {
+        destinos[hoja.get(f"{{{NS_REL_DOCUMENTO}}}id")]: hoja.get("name")
+        for hoja in libro.iter(f"{{{NS_HOJA}}}sheet")
+    }
+
+
+def celdas_fila(elem_fila):
+    """
+    Devuelve las celdas de una fila del XML de la hoja junto con su columna.
+
+    Una celda sin referencia (atributo 'r') ocupa la columna siguiente a la anterior.
+
+    :param elem_fila: El elemento <row> de la fila.
+    :type elem_fila: lxml.etree._Element
+    :returns: Una tupla (índice de columna 1-indexed, elemento <c>) por celda, en orden.
+    :rtype: list
+    """
+    celdas = []
+    for elem_celda in elem_fila.iter(TAG_CELDA):
+        ref = elem_celda.get("r")
+        if ref is None:
+            col_index = (celdas[-1][0] if celdas else 0) + 1
+        else:
+            col_index = openpyxl.utils.column_index_from_string(ref.rstrip("0123456789"))
+        celdas.append((col_index, elem_celda))
+    return celdas
+
+
+def parchear_fila(elem_fila, fila, formulas, compartidas):
+    """
+    Escribe las fórmulas de enlace en las celdas de destino de una fila del XML de la hoja.
+
+    Las celdas de destino existentes conservan su estilo (atributo 's') y se sustituye
+    su contenido por la fórmula; las que no existen se crean en su posición, ya que las
+    celdas de una fila deben estar ordenadas por columna.
+
+    Si una celda sustituida es la celda principal de una fórmula compartida, la fórmula
+    se guarda en `compartidas` para escribirla en las demás celdas de su rango
+    (ver `expandir_formulas_compartidas`).
+
+    :param elem_fila: El elemento <row> de la fila.
+    :type elem_fila: lxml.etree._Element
+    :param fila: El número de la fila (1-indexed).
+    :type fila: int
+    :param formulas: Las fórmulas del código de la fila, en el orden de PLAN_ESCRITURA.
+    :type formulas: tuple
+    :param compartidas: Las fórmulas compartidas sustituidas: {si: (texto, celda principal, última fila)}.
+    :type compartidas: dict
+    """
+    celdas = celdas_fila(elem_fila)
+    columnas = [col_index for col_index, _ in celdas]
+    celdas = dict(celdas)
+
+    for (col_index, col_letra), formula in zip(PLAN_ESCRITURA, formulas):
+        elem_celda = celdas.get(col_index)
+        if elem_celda is None:
+            elem_celda = lxml_etree.Element(TAG_CELDA)
+            posicion = bisect.bisect(columnas, col_index)
+            elem_fila.insert(posicion, elem_celda)
+            columnas.insert(posicion, col_index)
+        else:
+            elem_formula = elem_celda.find(TAG_FORMULA)
+            if (
+                elem_formula is not None
+                and elem_formula.get("t") == "shared"
+                and elem_formula.get("ref") is not None
+            ):
+                ultima_fila = openpyxl.utils.cell.range_boundaries(elem_formula.get("ref"))[3]
+                compartidas[elem_formula.get("si")] = (elem_formula.text or "", f"{col_letra}{fila}", ultima_fila)
+            estilo = elem_celda.get("s")
+            # Quitar el valor anterior (y su tipo), conservando solo el estilo.
+            elem_celda.clear()
+            if estilo is not None:
+                elem_celda.set("s", estilo)
+        elem_celda.set("r", f"{col_letra}{fila}")
+        # En el XML la fórmula se guarda sin el '=' inicial.
+        lxml_etree.SubElement(elem_celda, TAG_FORMULA).text = formula[1:]
+
+    # El rango de columnas ocupadas ('spans') es opcional y puede haber cambiado.
+    elem_fila.attrib.pop("spans", None)
+
+
+def expandir_formulas_compartidas(elem_fila, fila, compartidas):
+    """
+    Escribe la fórmula completa en las celdas de una fila que dependen de una fórmula
+    compartida cuya celda principal se ha sustituido.
+
+    En el XML, una fórmula compartida (<f t="shared" ref="..." si="...">) solo tiene el
+    texto en su celda principal; el resto de celdas del rango la referencian por su
+    índice 'si'. Sin la celda principal, Excel da el archivo por dañado, así que a cada
+    una se le escribe la fórmula trasladada a su posición, como fórmula normal.
+
+    :param elem_fila: El elemento <row> de la fila.
+    :type elem_fila: lxml.etree._Element
+    :param fila: El número de la fila (1-indexed).
+    :type fila: int
+    :param compartidas: Las fórmulas compartidas sustituidas: {si: (texto, celda principal, última fila)}.
+    :type compartidas: dict
+    """
+    for col_index, elem_celda in celdas_fila(elem_fila):
+        elem_formula = elem_celda.find(TAG_FORMULA)
+        if elem_formula is None or elem_formula.get("t") != "shared":
+            continue
+        compartida = compartidas.get(elem_formula.get("si"))
+        if compartida is None:
+            continue
+        texto, origen, _ = compartida
+        destino = f"{openpyxl.utils.get_column_letter(col_index)}{fila}"
+        elem_formula.text = Translator(f"={texto}", origin=origen).translate_formula(destino)[1:]
+        for atributo in ("t", "si", "ref"):
+            elem_formula.attrib.pop(atributo, None)
+
+
+def serializar_elemento(elem, declaraciones_raiz):
+    """
+    Serializa un elemento del XML de la hoja sin repetir los espacios de nombres de la raíz.
+
+    lxml declara en cada elemento serializado todos los espacios de nombres en uso
+    (unos 300 bytes por fila en un libro de Excel), aunque ya estén declarados en
+    <worksheet>. Se quitan las declaraciones idénticas a las de la raíz.
+
+    :param elem: El elemento a serializar.
+    :type elem: lxml.etree._Element
+    :param declaraciones_raiz: Las declaraciones de la raíz (ej. b'xmlns="..."').
+    :type declaraciones_raiz: frozenset
+    :returns: El elemento serializado en UTF-8.
+    :rtype: bytes
+    """
+    xml = lxml_etree.tostring(elem, encoding="UTF-8", xml_declaration=False)
+    coincidencia = PATRON_DECLARACIONES_NS.match(xml)
+    if coincidencia is None:
+        return xml
+    propias = b"".join(
+        declaracion
+        for declaracion in PATRON_DECLARACION_NS.findall(coincidencia.group(2))
+        if declaracion.lstrip() not in declaraciones_raiz
+    )
+    return coincidencia.group(1) + propias + xml[coincidencia.end():]
+
+
+def ampliar_dimension(ref, ultima_fila):
+    """
+    Amplía el rango de '<dimension ref>' de una hoja para que incluya las fórmulas escritas.
+
+    La dimensión se calcula una sola vez por hoja a partir de la última fila con código y
+    de la última columna de destino (MAX_DEST_COL), en lugar de ir actualizándola celda a celda.
+
+    :param ref: El rango declarado en la hoja (ej. 'A1:F9' o 'A1').
+    :type ref: str
+    :param ultima_fila: La última fila (1-indexed) que recibe fórmulas.
+    :type ultima_fila: int
+    :returns: El rango ampliado (ej. 'A1:M9').
+    :rtype: str
+    """
+    min_col, min_fila, max_col, max_fila = openpyxl.utils.cell.range_boundaries(ref)
+    min_col = min(min_col, PLAN_ESCRITURA[0][0])
+    min_fila = min(min_fila, FILA_INICIO)
+    max_col = max(max_col, MAX_DEST_COL)
+    max_fila = max(max_fila, ultima_fila)
+    return (
+        f"{openpyxl.utils.get_column_letter(min_col)}{min_fila}:"
+        f"{openpyxl.utils.get_column_letter(max_col)}{max_fila}"
+    )
+
+
+def parchear_hoja(xml_origen, xml_destino, formulas_hoja):
+    """
+    Copia en streaming el XML de una hoja escribiendo las fórmulas en sus filas de datos.
+
+    El XML se recorre con `iterparse` y se escribe con `xmlfile` fila a fila, sin
+    cargar la hoja completa en memoria. Todo lo demás (estilos de celdas, columnas,
+    celdas combinadas, formato condicional...) se copia sin cambios.
+
+    :param xml_origen: La parte XML de la hoja en 'CONSOLIDADO.xlsx'.
+    :type xml_origen: file-like object
+    :param xml_destino: La parte XML de la hoja en el archivo de salida.
+    :type xml_destino: file-like object
+    :param formulas_hoja: Las tuplas (fila, código, fórmulas) de la hoja.
+    :type formulas_hoja: list
+    """
+    formulas_por_fila = {fila: formulas for fila, _, formulas in formulas_hoja}
+    # Fórmulas compartidas cuya celda principal se ha sustituido por una fórmula de enlace.
+    compartidas = {}
+
+    def escribir(elem):
+        # Los elementos se escriben ya serializados, sin las declaraciones de la raíz,
+        # después de vaciar lo que `xmlfile` tenga pendiente.
+        xf.flush()
+        xml_destino.write(serializar_elemento(elem, declaraciones_raiz))
+
+    with lxml_etree.xmlfile(xml_destino, encoding="UTF-8") as xf:
+        xf.write_declaration(standalone=True)
+        # La raíz (<worksheet>) y <sheetData> se abren al empezar y se cierran al terminar;
+        # el resto de elementos se escriben completos al terminar de leerlos.
+        with contextlib.ExitStack() as elemento_raiz:
+            elemento_datos = contextlib.ExitStack()
+            raiz = None
+            fila = 0
+            for evento, elem in lxml_etree.iterparse(xml_origen, events=("start", "end")):
+                if evento == "start":
+                    if raiz is None:
+                        raiz = elem
+                        elemento_raiz.enter_context(xf.element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap))
+                        etiqueta_raiz = lxml_etree.tostring(lxml_etree.Element(elem.tag, nsmap=elem.nsmap))
+                        declaraciones_raiz = frozenset(
+                            declaracion.lstrip() for declaracion in PATRON_DECLARACION_NS.findall(etiqueta_raiz)
+                        )
+                    elif elem.tag == TAG_DATOS_HOJA:
+                        elemento_datos.enter_context(xf.element(elem.tag, dict(elem.attrib)))
+                    continue
+
+                if elem.tag == TAG_FILA:
+                    # Una fila sin número ('r') es la siguiente a la anterior.
+                    fila = int(elem.get("r", fila + 1))
+                    formulas = formulas_por_fila.get(fila)
+                    if formulas is not None:
+                        parchear_fila(elem, fila, formulas, compartidas)
+                    if compartidas:
+                        expandir_formulas_compartidas(elem, fila, compartidas)
+                        for si in [si for si, (_, _, ultima_fila) in compartidas.items() if ultima_fila <= fila]:
+                            del compartidas[si]
+                    escribir(elem)
+                    # Liberar la fila ya escrita para mantener la memoria constante.
+                    elem.getparent().remove(elem)
+                elif elem.tag == TAG_DATOS_HOJA:
+                    elemento_datos.close()
+                    raiz.remove(elem)
+                elif elem.getparent() is raiz:
+                    if elem.tag == TAG_DIMENSION and formulas_hoja and elem.get("ref"):
+                        # Las fórmulas pueden ocupar columnas que la hoja no usaba.
+                        elem.set("ref", ampliar_dimension(elem.get("ref"), formulas_hoja[-1][0]))
+                    escribir(elem)
+                    raiz.remove(elem)
+
+
+def parchear_libro_calculo(xml_libro):
+    """
+    Fija en 'xl/workbook.xml' el modo de cálculo MODO_CALCULO, sin recálculo al abrir ni al guardar.
+
+    :param xml_libro: El contenido de 'xl/workbook.xml'.
+    :type xml_libro: bytes
+    :returns: El contenido modificado.
+    :rtype: bytes
+    """
+    libro = lxml_etree.fromstring(xml_libro)
+    calculo = libro.find(TAG_CALCULO)
+    if calculo is None:
+        # <calcPr> va detrás de <definedNames> y delante de los elementos de ELEMENTOS_TRAS_CALCULO.
+        calculo = lxml_etree.Element(TAG_CALCULO)
+        siguiente = next((elem for elem in libro if elem.tag in ELEMENTOS_TRAS_CALCULO), None)
+        if siguiente is None:
+            libro.append(calculo)
+        else:
+            siguiente.addprevious(calculo)
+    calculo.set("calcMode", MODO_CALCULO)
+    calculo.set("calcOnSave", "0")
+    calculo.attrib.pop("fullCalcOnLoad", None)
+    return lxml_etree.tostring(libro, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def copiar_info_zip(info):
+    """
+    Crea la entrada del archivo de salida equivalente a una entrada del ZIP de origen.
+
+    :param info: La entrada del ZIP de origen.
+    :type info: zipfile.ZipInfo
+    :returns: Una entrada nueva con el mismo nombre, fecha, compresión y atributos.
+    :rtype: zipfile.ZipInfo
+    """
+    info_salida = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    info_salida.compress_type = info.compress_type
+    info_salida.external_attr = info.external_attr
+    return info_salida
+
+
+def parchear_libro(ruta_consolidado, archivo_salida, partes_hojas, formulas_por_hoja, archivos_existentes):
+    """
+    Genera el archivo de salida como copia de 'CONSOLIDADO.xlsx' con las fórmulas añadidas.
+
+    Cada parte del ZIP se copia tal cual salvo el XML de las hojas objetivo, que se
+    reescribe en streaming con `parchear_hoja`, y 'xl/workbook.xml', donde se fija
+    el modo de cálculo. A diferencia de reescribir el libro con openpyxl, se conservan
+    los estilos, el formato, los gráficos, las tablas dinámicas, etc.
+
+    El archivo se escribe primero con la extensión '.tmp' y se renombra al terminar,
+    de modo que un error no deja un archivo de salida a medias.
+
+    :param ruta_consolidado: La ruta de 'CONSOLIDADO.xlsx'.
+    :type ruta_consolidado: str
+    :param archivo_salida: La ruta del archivo de salida.
+    :type archivo_salida: str
+    :param partes_hojas: El diccionario {parte del ZIP: nombre de hoja} de `localizar_hojas_libro`.
+    :type partes_hojas: dict
+    :param formulas_por_hoja: Las tuplas (fila, código, fórmulas) de cada hoja objetivo. Las
+        hojas se van sacando del diccionario a medida que se escriben.
+    :type formulas_por_hoja: dict
+    :param archivos_existentes: Los nombres normalizados de los archivos del directorio de origen.
+    :type archivos_existentes: set
+    """
+    ruta_temporal = f"{archivo_salida}.tmp"
+    try:
+        with zipfile.ZipFile(ruta_consolidado) as zip_origen, zipfile.ZipFile(
+            ruta_temporal, "w", zipfile.ZIP_DEFLATED
+        ) as zip_salida:
+            for info in zip_origen.infolist():
+                hoja = partes_hojas.get(info.filename)
+                with zip_origen.open(info) as parte_origen:
+                    if hoja in formulas_por_hoja:
+                        print(f"\nProcesando hoja: {hoja}")
+                        # Sacar las fórmulas de la hoja del diccionario para liberarlas al terminarla
+                        formulas_hoja = formulas_por_hoja.pop(hoja)
+                        info_salida = copiar_info_zip(info)
+                        info_salida.compress_type = zipfile.ZIP_DEFLATED
+                        with zip_salida.open(info_salida, "w", force_zip64=True) as parte_salida:
+                            parchear_hoja(parte_origen, parte_salida, formulas_hoja)
+                        escribir_registro(formulas_hoja, archivos_existentes)
+                        del formulas_hoja
+                        print(f"Fin de hoja '{hoja}'")
+                    elif info.filename == "xl/workbook.xml":
+                        zip_salida.writestr(copiar_info_zip(info), parchear_libro_calculo(parte_origen.read()))
+                    else:
+                        with zip_salida.open(copiar_info_zip(info), "w", force_zip64=True) as parte_salida:
+                            shutil.copyfileobj(parte_origen, parte_salida)
+        os.replace(ruta_temporal, archivo_salida)
+    finally:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
 
 
 # --- Función Principal ---
 
 
+def pausar_salida():
+    """
+    Mantiene la consola abierta hasta que el usuario pulse ENTER.
+
+    Solo espera si la entrada estándar es una terminal interactiva y no se ha desactivado
+    con CONSOLIDADO_NOPAUSE=1: desde un programador de tareas o un proceso padre no hay
+    nadie que pulse ENTER, y `input()` bloquearía la ejecución indefinidamente.
+    """
+    if PAUSAR_AL_SALIR and sys.stdin is not None and sys.stdin.isatty():
+        input("Presiona ENTER para salir...")
+
+
 def main():
     """
     Función principal que orquesta el proceso de autocompletado y consolidación.
 
-    Verifica la existencia del archivo 'CONSOLIDADO.xlsx', lo carga, itera
-    sobre las hojas objetivo definidas, llama a 'procesar_hoja' para cada una,
-    y finalmente guarda el libro de trabajo modificado bajo un nuevo nombre.
+    Verifica la existencia del archivo 'CONSOLIDADO.xlsx', lo abre en modo de
+    solo lectura y calcula en paralelo las fórmulas de cada hoja objetivo.
 
-    NOTA IMPORTANTE: Esta función intenta modificar el archivo 'CONSOLIDADO.xlsx'
-    directamente en memoria al cargarlo con `openpyxl.load_workbook(nombre_archivo)`.
-    Para archivos Excel muy grandes, esta aproximación es ineficiente y puede
-    llevar a un 'MemoryError'. Se recomienda la versión del script que crea un
-    nuevo archivo de salida con modo `read_only=True` para archivos grandes.
+    Si lxml está instalado, el archivo de salida es una copia de 'CONSOLIDADO.xlsx'
+    en la que solo se modifica el XML de las hojas objetivo ('parchear_libro'),
+    por lo que se conservan estilos y formato. Si no, recorre las hojas en orden:
+    las hojas objetivo se procesan con 'procesar_hoja' y el resto se copian sin
+    cambios a un libro nuevo en modo de solo escritura, que contiene solo los
+    valores y fórmulas de las celdas, sin estilos ni formato.
+
+    En ambos casos ninguna hoja se mantiene completa en memoria.
     """
     nombre_archivo = "CONSOLIDADO.xlsx"
     archivo_salida = "CONSOLIDADO_COMPLETADO.xlsx"
@@ -171,40 +941,113 @@ def main():
             f"El archivo '{nombre_archivo}' no fue encontrado en el directorio de trabajo actual."
         )
         print("Asegúrate de que esté en la misma carpeta que el script/ejecutable.")
-        input(
-            "Presiona ENTER para salir..."
-        )  # Mantener la consola abierta hasta que el usuario presione Enter
+        pausar_salida()  # Mantener la consola abierta hasta que el usuario presione Enter
         return  # Terminar la ejecución
 
-    # Intentar cargar el archivo 'CONSOLIDADO.xlsx'
-    try:
-        # Cargar el libro de trabajo completo.
-        # NOTA: Para archivos muy grandes, esta operación puede consumir mucha memoria.
-        wb = openpyxl.load_workbook(nombre_archivo)
-    except Exception as e:
-        # Capturar y reportar errores si el archivo no se puede abrir
-        print(f"No se pudo abrir el archivo Excel '{nombre_archivo}': {e}")
-        print("Esto podría deberse a un archivo corrupto o problemas de permisos.")
-        input("Presiona ENTER para salir...")
-        return  # Terminar la ejecución
+    # Con lxml, el archivo de salida se genera copiando 'CONSOLIDADO.xlsx' y modificando solo
+    # el XML de las hojas objetivo. Si lxml no está instalado o el libro no tiene la estructura
+    # habitual, se reescribe el libro fila a fila.
+    partes_hojas = None
+    if lxml_etree is not None:
+        try:
+            partes_hojas = localizar_hojas_libro(ruta_absoluta_consolidado)
+        except (KeyError, ValueError, OSError, zipfile.BadZipFile, ET.ParseError):
+            partes_hojas = None
+
+    wb_lectura = None
+    if partes_hojas is not None:
+        # Los nombres de las hojas ya se conocen por 'xl/workbook.xml': no hace falta abrir el
+        # libro con openpyxl (que carga las cadenas compartidas y los estilos de todo el libro).
+        # Las hojas no objetivo no se leen; solo se copian tal cual al generar la salida.
+        nombres_hojas = list(partes_hojas.values())
+    else:
+        # Intentar abrir el archivo 'CONSOLIDADO.xlsx'
+        try:
+            # Abrir el libro en modo de solo lectura: las filas se leen en streaming desde el XML.
+            # Sin 'data_only', para conservar las fórmulas existentes; sin cargar enlaces externos.
+            wb_lectura = openpyxl.load_workbook(nombre_archivo, read_only=True, keep_links=False)
+        except Exception as e:
+            # Capturar y reportar errores si el archivo no se puede abrir
+            print(f"No se pudo abrir el archivo Excel '{nombre_archivo}': {e}")
+            print("Esto podría deberse a un archivo corrupto o problemas de permisos.")
+            pausar_salida()
+            return  # Terminar la ejecución
+        nombres_hojas = wb_lectura.sheetnames
 
-    # Iterar sobre las hojas objetivo definidas en la constante HOJAS_OBJETIVO
+    # Listar una sola vez los archivos '[CODIGO].xlsx' del directorio de origen
+    archivos_existentes = listar_archivos_origen()
+
+    # Verificar que las hojas objetivo existen en el libro cargado
     for hoja in HOJAS_OBJETIVO:
-        # Verificar si la hoja existe en el libro de trabajo cargado
-        if hoja not in wb.sheetnames:
+        if hoja not in nombres_hojas:
             print(f"La hoja '{hoja}' no existe en el archivo. Saltando esta hoja.")
-            continue  # Pasar a la siguiente hoja si no se encuentra
+    hojas_a_procesar = [hoja for hoja in HOJAS_OBJETIVO if hoja in nombres_hojas]
+
+    try:
+        # Leer en paralelo, un proceso por hoja objetivo, los códigos de sus filas de datos.
+        # Las fórmulas y la escritura se hacen después en este proceso: los libros de salida
+        # no se pueden compartir entre procesos, y así la caché de fórmulas cubre todas las hojas.
+        try:
+            with ProcessPoolExecutor(max_workers=max(len(hojas_a_procesar), 1)) as executor:
+                filas_por_hoja = dict(
+                    zip(
+                        hojas_a_procesar,
+                        executor.map(
+                            functools.partial(leer_filas_codigo, ruta_absoluta_consolidado),
+                            hojas_a_procesar,
+                        ),
+                    )
+                )
+        except Exception as e:
+            # Los procesos son los primeros en leer las hojas: un archivo dañado (ej. el XML
+            # de una hoja incompleto) se detecta aquí, sobre todo cuando no se ha abierto
+            # el libro con openpyxl por usar el modo de copia con lxml.
+            print(f"No se pudo abrir el archivo Excel '{nombre_archivo}': {e}")
+            print("Esto podría deberse a un archivo corrupto o problemas de permisos.")
+            pausar_salida()
+            return  # Terminar la ejecución
+        formulas_por_hoja = {
+            hoja: calcular_formulas_hoja(filas_codigo) for hoja, filas_codigo in filas_por_hoja.items()
+        }
 
-        print(f"\nProcesando hoja: {hoja}")
-        # Obtener el objeto de la hoja de trabajo actual
-        ws = wb[hoja]
-        # Llamar a la función para procesar la hoja. Ya no necesita el argumento de ruta base.
-        procesar_hoja(ws)
-        print(f"Fin de hoja '{hoja}'")
+        if partes_hojas is None:
+            # Crear el libro de salida (XlsxWriter u openpyxl en modo de solo escritura;
+            # las filas se añaden con `append`)
+            wb_salida = crear_libro_salida(archivo_salida)
+            # Recorrer todas las hojas en su orden original para conservarlo en el archivo de salida
+            for hoja in wb_lectura.sheetnames:
+                ws_lectura = wb_lectura[hoja]
+                # En modo de solo lectura openpyxl itera hasta la dimensión declarada en el
+                # archivo ('<dimension ref="A1:N1048576"/>'), que algunas aplicaciones guardan
+                # mal: se recorrerían hasta un millón de filas vacías. Sin dimensiones, se
+                # leen solo las filas que existen en el XML de la hoja.
+                ws_lectura.reset_dimensions()
+                ws_salida = wb_salida.create_sheet(hoja)
+                if hoja not in HOJAS_OBJETIVO:
+                    # Las hojas no objetivo se copian sin cambios
+                    for valores_fila in ws_lectura.iter_rows(values_only=True):
+                        ws_salida.append(valores_fila)
+                    continue
 
-    # Guardar el libro de trabajo modificado con un nuevo nombre
+                print(f"\nProcesando hoja: {hoja}")
+                # Llamar a la función para procesar la hoja. Sus fórmulas se sacan del diccionario
+                # para liberarlas en cuanto se escriben, antes de guardar el libro.
+                procesar_hoja(ws_lectura, ws_salida, formulas_por_hoja.pop(hoja), archivos_existentes)
+                print(f"Fin de hoja '{hoja}'")
+    finally:
+        # Cerrar el libro de lectura (libera el archivo) antes de guardar
+        if wb_lectura is not None:
+            wb_lectura.close()
+
+    # Guardar el libro de trabajo de salida con un nuevo nombre
     try:
-        wb.save(archivo_salida)
+        if partes_hojas is not None:
+            # Copiar 'CONSOLIDADO.xlsx' escribiendo las fórmulas en el XML de las hojas objetivo
+            parchear_libro(
+                ruta_absoluta_consolidado, archivo_salida, partes_hojas, formulas_por_hoja, archivos_existentes
+            )
+        else:
+            wb_salida.save(archivo_salida)
         print(f"\nArchivo guardado como '{archivo_salida}'")
     except Exception as e:
         print(f"Error al guardar el archivo '{archivo_salida}': {e}")
@@ -212,9 +1055,11 @@ def main():
     finally:
         # Este input se asegura de que la consola no se cierre inmediatamente
         # después de completar o fallar en el guardado.
-        input("Presiona ENTER para salir...")
+        pausar_salida()
 
 
 # Punto de entrada del script
 if __name__ == "__main__":
+    # Necesario para que el pool de procesos funcione en el ejecutable de PyInstaller (Windows).
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,334 @@
+"""
+Lectura directa de celdas de archivos Excel (.xlsx) sin construir el libro completo.
+
+Módulo compartido por 'autocompletar_consolidado.py' y 'autocompletar_consolidado_v0.2.py'
+para leer las celdas de origen de los archivos individuales '[CODIGO].xlsx'. En lugar de
+cargar el libro con openpyxl (estilos, nombres definidos, gráficos...), abre el .xlsx
+como ZIP y recorre en streaming solo el XML de la hoja activa.
+"""
+
+import datetime
+import openpyxl
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel
+
+# lxml es opcional: si está instalado se usa su `iterparse` (en C) para recorrer el XML
+# de la hoja de cada archivo. Si no, se usa ElementTree de la librería estándar.
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# Espacios de nombres XML del formato OOXML (.xlsx) necesarios para la lectura directa.
+NS_HOJA = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL_DOCUMENTO = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_REL_PAQUETE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+TAG_CELDA = f'{{{NS_HOJA}}}c'
+TAG_FILA = f'{{{NS_HOJA}}}row'
+TAG_VALOR = f'{{{NS_HOJA}}}v'
+TAG_TEXTO = f'{{{NS_HOJA}}}t'
+TAG_CADENA = f'{{{NS_HOJA}}}si'
+TAG_FONETICA = f'{{{NS_HOJA}}}rPh'
+TAG_DATOS_HOJA = f'{{{NS_HOJA}}}sheetData'
+TAG_FORMATO_NUMERO = f'{{{NS_HOJA}}}numFmt'
+TAG_ESTILOS_CELDA = f'{{{NS_HOJA}}}cellXfs'
+TAG_ESTILO = f'{{{NS_HOJA}}}xf'
+
+# --- Funciones de Lectura ---
+
+def localizar_partes_libro(zip_origen):
+    """
+    Localiza dentro de un archivo .xlsx la hoja activa, la tabla de cadenas compartidas y los estilos.
+
+    Lee 'xl/workbook.xml' para obtener el índice de la hoja activa (igual que
+    `wb.active` en openpyxl) y el calendario de fechas del libro, y
+    'xl/_rels/workbook.xml.rels' para traducir la hoja a la ruta de su XML dentro del ZIP.
+
+    :param zip_origen: El archivo .xlsx abierto como ZIP.
+    :type zip_origen: zipfile.ZipFile
+    :returns: Una tupla (ruta de la hoja activa, ruta de las cadenas compartidas o None,
+    ruta de los estilos o None, fecha de origen del calendario del libro).
+    :rtype: tuple
+    :raises ValueError: Si el libro no usa el formato OOXML habitual o no contiene hojas.
+    :raises KeyError: Si falta alguna de las partes necesarias.
+    """
+    libro = ET.fromstring(zip_origen.read('xl/workbook.xml'))
+    if libro.tag != f'{{{NS_HOJA}}}workbook':
+        raise ValueError(f"Formato de libro no soportado: {libro.tag}")
+
+    hojas = libro.findall(f'{{{NS_HOJA}}}sheets/{{{NS_HOJA}}}sheet')
+    if not hojas:
+        raise ValueError("El libro no contiene hojas")
+    vista = libro.find(f'{{{NS_HOJA}}}bookViews/{{{NS_HOJA}}}workbookView')
+    indice_activo = int(vista.get('activeTab', 0)) if vista is not None else 0
+    if indice_activo >= len(hojas):
+        indice_activo = 0
+    id_hoja = hojas[indice_activo].get(f'{{{NS_REL_DOCUMENTO}}}id')
+    # Los libros con el calendario de 1904 (Excel para Mac) cuentan las fechas desde otro origen.
+    propiedades = libro.find(f'{{{NS_HOJA}}}workbookPr')
+    fecha_1904 = propiedades is not None and propiedades.get('date1904') in ('1', 'true')
+    epoca = MAC_EPOCH if fecha_1904 else WINDOWS_EPOCH
+
+    ruta_hoja = None
+    ruta_cadenas = None
+    ruta_estilos = None
+    relaciones = ET.fromstring(zip_origen.read('xl/_rels/workbook.xml.rels'))
+    for relacion in relaciones.iter(f'{{{NS_REL_PAQUETE}}}Relationship'):
+        destino = relacion.get('Target', '')
+        # Los destinos son relativos a 'xl/' salvo que empiecen por '/'.
+        if destino.startswith('/'):
+            destino = destino.lstrip('/')
+        else:
+            destino = posixpath.normpath(posixpath.join('xl', destino))
+        if relacion.get('Id') == id_hoja:
+            ruta_hoja = destino
+        elif relacion.get('Type', '').endswith('/sharedStrings'):
+            ruta_cadenas = destino
+        elif relacion.get('Type', '').endswith('/styles'):
+            ruta_estilos = destino
+
+    if ruta_hoja is None:
+        raise KeyError(f"No se encontró la hoja activa ({id_hoja}) en el libro")
+    return ruta_hoja, ruta_cadenas, ruta_estilos, epoca
+
+def leer_cadenas_compartidas(zip_origen, ruta_cadenas, indice_maximo=None):
+    """
+    Carga la tabla de cadenas compartidas ('xl/sharedStrings.xml') de un archivo .xlsx.
+
+    La tabla se recorre en streaming, cadena a cadena (<si>), y la lectura se detiene
+    en cuanto se alcanza `indice_maximo`, ya que las cadenas posteriores no se usan.
+
+    :param zip_origen: El archivo .xlsx abierto como ZIP.
+    :type zip_origen: zipfile.ZipFile
+    :param ruta_cadenas: Ruta de la tabla dentro del ZIP, o None si el libro no tiene.
+    :type ruta_cadenas: str or None
+    :param indice_maximo: El mayor índice que se va a consultar, o None para leer la tabla entera.
+    :type indice_maximo: int or None
+    :returns: Las cadenas compartidas, en orden de índice.
+    :rtype: list
+    """
+    if ruta_cadenas is None:
+        return []
+    cadenas = []
+    with zip_origen.open(ruta_cadenas) as xml_cadenas:
+        for _, elem_cadena in ET.iterparse(xml_cadenas, events=('end',)):
+            if elem_cadena.tag != TAG_CADENA:
+                continue
+            # Una cadena con formato enriquecido se reparte en varios <t>; se excluyen
+            # los textos fonéticos (<rPh>), igual que hace openpyxl.
+            foneticos = {id(t) for rph in elem_cadena.iter(TAG_FONETICA) for t in rph.iter(TAG_TEXTO)}
+            cadenas.append(''.join(t.text or '' for t in elem_cadena.iter(TAG_TEXTO) if id(t) not in foneticos))
+            elem_cadena.clear()
+            if indice_maximo is not None and len(cadenas) > indice_maximo:
+                break
+    return cadenas
+
+def leer_estilos_fecha(zip_origen, ruta_estilos, estilo_maximo):
+    """
+    Obtiene qué estilos de celda de un archivo .xlsx tienen formato de fecha u hora.
+
+    Excel guarda las fechas como números de serie; solo el formato numérico del
+    estilo de la celda (atributo 's') indica que el número es una fecha. Se aplican
+    las mismas reglas que openpyxl. 'xl/styles.xml' se recorre en streaming y la
+    lectura se detiene en cuanto se alcanza `estilo_maximo`.
+
+    :param zip_origen: El archivo .xlsx abierto como ZIP.
+    :type zip_origen: zipfile.ZipFile
+    :param ruta_estilos: Ruta de los estilos dentro del ZIP, o None si el libro no tiene.
+    :type ruta_estilos: str or None
+    :param estilo_maximo: El mayor índice de estilo que se va a consultar.
+    :type estilo_maximo: int
+    :returns: Un diccionario {índice de estilo: True si es una duración, False si es una fecha}
+    con los estilos de fecha u hora.
+    :rtype: dict
+    """
+    if ruta_estilos is None:
+        return {}
+    formatos_propios = {}
+    estilos_fecha = {}
+    indice = 0
+    en_estilos_celda = False
+    with zip_origen.open(ruta_estilos) as xml_estilos:
+        for evento, elem in ET.iterparse(xml_estilos, events=('start', 'end')):
+            if elem.tag == TAG_ESTILOS_CELDA:
+                # <cellXfs> contiene los estilos de las celdas (los <xf> de <cellStyleXfs>
+                # son estilos con nombre y no se cuentan).
+                en_estilos_celda = evento == 'start'
+                if not en_estilos_celda:
+                    break
+            elif evento == 'end' and elem.tag == TAG_FORMATO_NUMERO and not en_estilos_celda:
+                formatos_propios[int(elem.get('numFmtId'))] = elem.get('formatCode', '')
+            elif evento == 'end' and elem.tag == TAG_ESTILO and en_estilos_celda:
+                id_formato = int(elem.get('numFmtId', 0))
+                formato = formatos_propios.get(id_formato) or builtin_format_code(id_formato)
+                if formato and is_date_format(formato):
+                    estilos_fecha[indice] = is_timedelta_format(formato)
+                indice += 1
+                if indice > estilo_maximo:
+                    break
+    return estilos_fecha
+
+def convertir_valor_xml(tipo, texto, cadenas, formato_fecha=None, epoca=WINDOWS_EPOCH):
+    """
+    Convierte el contenido bruto de una celda del XML de la hoja a un valor de Python.
+
+    Sigue las mismas reglas que openpyxl en modo `data_only=True`: las fórmulas
+    devuelven su último valor calculado y los números con un estilo de fecha u
+    hora se convierten a datetime (o timedelta, si el formato es de duración).
+
+    :param tipo: El atributo 't' de la celda ('n', 's', 'str', 'inlineStr', 'b', 'e', 'd').
+    :type tipo: str
+    :param texto: El texto del valor de la celda, o None si no tiene valor.
+    :type texto: str or None
+    :param cadenas: La tabla de cadenas compartidas del libro.
+    :type cadenas: list
+    :param formato_fecha: None si el estilo de la celda no es de fecha; si lo es, True para
+    un formato de duración y False para una fecha u hora (ver `leer_estilos_fecha`).
+    :type formato_fecha: bool or None
+    :param epoca: La fecha de origen del calendario del libro.
+    :type epoca: datetime.datetime
+    :returns: El valor de la celda.
+    :rtype: any or None
+    """
+    if texto is None:
+        return None
+    if tipo == 's':
+        return cadenas[int(texto)]
+    if tipo in ('str', 'inlineStr', 'e'):
+        return texto
+    if tipo == 'b':
+        return texto == '1'
+    if tipo == 'd':
+        return datetime.datetime.fromisoformat(texto)
+    # Valor numérico: entero salvo que tenga parte decimal o exponente.
+    if '.' in texto or 'E' in texto or 'e' in texto:
+        valor = float(texto)
+    else:
+        valor = int(texto)
+    if formato_fecha is None:
+        return valor
+    try:
+        return from_excel(valor, epoca, timedelta=formato_fecha)
+    except (OverflowError, ValueError):
+        # Número fuera del rango de fechas: openpyxl lo trata como un error de celda.
+        return '#VALUE!'
+
+def celdas_fila(elem_fila):
+    """
+    Devuelve las celdas de una fila del XML de la hoja junto con su columna.
+
+    Una celda sin referencia (atributo 'r') ocupa la columna siguiente a la anterior,
+    igual que la interpretan openpyxl y Excel.
+
+    :param elem_fila: El elemento <row> de la fila.
+    :type elem_fila: xml.etree.ElementTree.Element or lxml.etree._Element
+    :returns: Una tupla (índice de columna 1-indexed, elemento <c>) por celda, en orden.
+    :rtype: list
+    """
+    celdas = []
+    columna = 0
+    for elem_celda in elem_fila.iter(TAG_CELDA):
+        ref = elem_celda.get('r')
+        if ref is None:
+            columna += 1
+        else:
+            columna = openpyxl.utils.column_index_from_string(ref.rstrip('0123456789'))
+        celdas.append((columna, elem_celda))
+    return celdas
+
+def contenido_celda(elem_celda):
+    """
+    Extrae el contenido bruto de una celda del XML de la hoja, sin convertirlo.
+
+    :param elem_celda: El elemento <c> de la celda.
+    :type elem_celda: xml.etree.ElementTree.Element or lxml.etree._Element
+    :returns: Una tupla (tipo, texto del valor o None, índice de estilo), ver `convertir_valor_xml`.
+    :rtype: tuple
+    """
+    tipo = elem_celda.get('t', 'n')
+    if tipo == 'inlineStr':
+        texto = ''.join(t.text or '' for t in elem_celda.iter(TAG_TEXTO))
+    else:
+        elem_valor = elem_celda.find(TAG_VALOR)
+        texto = elem_valor.text if elem_valor is not None else None
+    return tipo, texto, int(elem_celda.get('s', 0))
+
+def leer_cinco_celdas_rapido(ruta_archivo_origen, refs):
+    """
+    Lee las celdas de origen de un archivo '[CODIGO].xlsx' analizando directamente su XML.
+
+    En lugar de construir un Workbook completo (estilos, nombres definidos,
+    gráficos...), abre el .xlsx como ZIP y recorre en streaming solo el XML de la
+    hoja activa, fila a fila, deteniéndose en cuanto ha encontrado todas las celdas
+    o ha superado la última fila necesaria. Las filas y celdas sin referencia
+    (atributo 'r') se sitúan a continuación de la anterior.
+
+    :param ruta_archivo_origen: Ruta completa al archivo '[CODIGO].xlsx'.
+    :type ruta_archivo_origen: str
+    :param refs: Las referencias de las celdas a leer (ej. 'N21').
+    :type refs: frozenset
+    :returns: Un diccionario {referencia: valor}; las celdas vacías o ausentes valen None.
+    :rtype: dict
+    :raises ValueError, KeyError: Si el archivo no tiene la estructura .xlsx esperada.
+    """
+    # Celdas buscadas agrupadas por fila: {fila: {columna: referencia}}.
+    buscadas = {}
+    for ref in refs:
+        fila, columna = openpyxl.utils.cell.coordinate_to_tuple(ref)
+        buscadas.setdefault(fila, {})[columna] = ref
+    fila_maxima = max(buscadas)
+    # Contenido bruto de cada celda encontrada: (tipo, texto, estilo).
+    crudos = {}
+    with zipfile.ZipFile(ruta_archivo_origen) as zip_origen:
+        ruta_hoja, ruta_cadenas, ruta_estilos, epoca = localizar_partes_libro(zip_origen)
+        with zip_origen.open(ruta_hoja) as xml_hoja:
+            if lxml_etree is not None:
+                # lxml filtra por etiqueta en C: solo se reciben los eventos de fin de fila.
+                eventos = lxml_etree.iterparse(xml_hoja, events=('end',), tag=TAG_FILA)
+            else:
+                # ElementTree no permite llegar al padre de un elemento: se recibe también el
+                # inicio de <sheetData> para poder quitar de él las filas ya recorridas.
+                eventos = ET.iterparse(xml_hoja, events=('start', 'end'))
+            datos_hoja = None
+            fila = 0
+            for evento, elem in eventos:
+                if evento == 'start':
+                    if elem.tag == TAG_DATOS_HOJA:
+                        datos_hoja = elem
+                    continue
+                if elem.tag != TAG_FILA:
+                    continue
+                # Una fila sin número (atributo 'r') es la siguiente a la anterior.
+                fila = int(elem.get('r', fila + 1))
+                columnas = buscadas.get(fila)
+                if columnas:
+                    for columna, elem_celda in celdas_fila(elem):
+                        ref = columnas.get(columna)
+                        if ref is not None:
+                            crudos[ref] = contenido_celda(elem_celda)
+                if lxml_etree is not None:
+                    elem.clear()
+                    # Quitar del árbol las filas ya recorridas (lxml las conserva vacías).
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                elif datos_hoja is not None:
+                    datos_hoja.remove(elem)
+                # Las filas están ordenadas: pasada la última fila necesaria no queda nada por leer.
+                if len(crudos) == len(refs) or fila >= fila_maxima:
+                    break
+
+        # La tabla de cadenas compartidas solo se carga si alguna celda leída la usa
+        # (t="s"), y solo hasta el mayor índice referenciado.
+        indices_cadenas = [int(texto) for tipo, texto, _ in crudos.values() if tipo == 's' and texto is not None]
+        cadenas = leer_cadenas_compartidas(zip_origen, ruta_cadenas, max(indices_cadenas)) if indices_cadenas else []
+        # Igualmente, los estilos solo se leen si alguna celda leída es numérica (puede ser una fecha).
+        estilos_numeros = [estilo for tipo, texto, estilo in crudos.values() if tipo == 'n' and texto is not None]
+        estilos_fecha = leer_estilos_fecha(zip_origen, ruta_estilos, max(estilos_numeros)) if estilos_numeros else {}
+
+    valores = dict.fromkeys(refs)
+    for ref, (tipo, texto, estilo) in crudos.items():
+        valores[ref] = convertir_valor_xml(tipo, texto, cadenas, estilos_fecha.get(estilo), epoca)
+    return valores
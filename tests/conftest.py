@@ -0,0 +1,68 @@
+"""
+Utilidades comunes de las pruebas: acceso a los scripts y creación de libros de prueba.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+import zipfile
+
+import pytest
+
+# Los scripts y 'lector_xlsx.py' están en la raíz del repositorio, no en un paquete.
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPOSITORIO)
+
+
+def cargar_script(nombre_archivo):
+    """
+    Importa uno de los scripts de la raíz como módulo (sus nombres no son importables, ej. 'v0.2').
+
+    :param nombre_archivo: Nombre del archivo del script (ej. 'autocompletar_consolidado_v0.2.py').
+    :type nombre_archivo: str
+    :returns: El módulo cargado.
+    :rtype: module
+    """
+    nombre_modulo = os.path.splitext(nombre_archivo)[0].replace('.', '_')
+    spec = importlib.util.spec_from_file_location(nombre_modulo, os.path.join(RAIZ_REPOSITORIO, nombre_archivo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def reescribir_parte(ruta_xlsx, parte, sustituciones):
+    """
+    Aplica sustituciones de expresiones regulares a una parte XML de un archivo .xlsx.
+
+    Sirve para generar variantes válidas del formato que openpyxl no escribe
+    (ej. celdas sin atributo 'r').
+
+    :param ruta_xlsx: Ruta del archivo .xlsx, que se reescribe en el sitio.
+    :type ruta_xlsx: str
+    :param parte: Ruta de la parte dentro del ZIP (ej. 'xl/worksheets/sheet1.xml').
+    :type parte: str
+    :param sustituciones: Pares (patrón, reemplazo) que se aplican en orden.
+    :type sustituciones: list
+    """
+    with zipfile.ZipFile(ruta_xlsx) as zip_origen:
+        contenido = {info.filename: zip_origen.read(info) for info in zip_origen.infolist()}
+    xml = contenido[parte].decode('utf-8')
+    for patron, reemplazo in sustituciones:
+        xml = re.sub(patron, reemplazo, xml)
+    contenido[parte] = xml.encode('utf-8')
+    with zipfile.ZipFile(ruta_xlsx, 'w', zipfile.ZIP_DEFLATED) as zip_destino:
+        for nombre, datos in contenido.items():
+            zip_destino.writestr(nombre, datos)
+
+
+@pytest.fixture(params=['lxml', 'elementtree'])
+def analizador_xml(request, monkeypatch):
+    """Ejecuta la prueba con lxml y con ElementTree de la librería estándar."""
+    import lector_xlsx
+    if request.param == 'lxml':
+        if lector_xlsx.lxml_etree is None:
+            pytest.skip('lxml no está instalado')
+    else:
+        monkeypatch.setattr(lector_xlsx, 'lxml_etree', None)
+    return request.param
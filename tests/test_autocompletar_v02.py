@@ -0,0 +1,129 @@
+"""
+Pruebas de 'autocompletar_consolidado_v0.2.py'.
+"""
+
+import csv
+import os
+import sys
+
+import openpyxl
+import pytest
+
+from conftest import cargar_script, reescribir_parte
+
+v02 = cargar_script('autocompletar_consolidado_v0.2.py')
+
+requiere_pyarrow = pytest.mark.skipif(v02.pyarrow is None, reason='pyarrow no está instalado')
+
+
+@requiere_pyarrow
+def test_parquet_usa_la_fila_mas_ancha_del_primer_lote(tmp_path):
+    ruta = str(tmp_path / 'hoja.parquet')
+    hoja = v02.HojaSalidaParquet(ruta, 1, 0)
+    hoja.append(('Nombre', 'Valor'))
+    hoja.append(('a', 1))
+    hoja.append(('b', 2, None, 'extra'))
+    hoja.cerrar()
+
+    tabla = v02.pyarrow.parquet.read_table(ruta)
+    assert tabla.column_names == ['Nombre', 'Valor', 'C', 'D']
+    assert tabla.column('D').to_pylist() == [None, 'extra']
+
+
+@requiere_pyarrow
+def test_parquet_rechaza_datos_fuera_de_las_columnas(tmp_path, monkeypatch):
+    monkeypatch.setattr(v02, 'FILAS_POR_LOTE_PARQUET', 2)
+    ruta = str(tmp_path / 'hoja.parquet')
+    hoja = v02.HojaSalidaParquet(ruta, 1, 0)
+    hoja.append(('Nombre', 'Valor'))
+    hoja.append(('a', 1))
+    hoja.append(('b', 2))
+    # Las celdas vacías al final de una fila más ancha no se pierden: se aceptan.
+    hoja.append(('c', 3, None))
+    with pytest.raises(ValueError, match='columna C'):
+        hoja.append(('d', 4, 'perdido'))
+    hoja.cerrar()
+
+
+def crear_archivo_codigo(ruta, valores):
+    """Crea un '[CODIGO].xlsx' con los valores dados en las celdas de origen."""
+    wb = openpyxl.Workbook()
+    for celda, valor in zip(v02.COL_INDICES_DESTINO.values(), valores):
+        wb.active[celda] = valor
+    wb.save(ruta)
+
+
+def test_cache_valida_solo_si_el_archivo_no_cambia(tmp_path):
+    directorio_cache = str(tmp_path / 'cache')
+    ruta = str(tmp_path / 'A1.xlsx')
+    crear_archivo_codigo(ruta, (1, 2, 3, 4, 5))
+    v02.guardar_en_cache(directorio_cache, ruta, (1, 2, 3, 4, 5))
+    assert v02.cargar_desde_cache(directorio_cache, ruta) == (1, 2, 3, 4, 5)
+
+    # Misma fecha de modificación y distinto tamaño.
+    estado = os.stat(ruta)
+    with open(ruta, 'ab') as f:
+        f.write(b'\0')
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+    assert v02.cargar_desde_cache(directorio_cache, ruta) is None
+
+    # Mismo tamaño y distinta fecha de modificación.
+    v02.guardar_en_cache(directorio_cache, ruta, (1, 2, 3, 4, 5))
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+    assert v02.cargar_desde_cache(directorio_cache, ruta) is None
+
+
+def test_cache_de_otra_version_no_se_usa(tmp_path, monkeypatch):
+    directorio_cache = str(tmp_path / 'cache')
+    ruta = str(tmp_path / 'A1.xlsx')
+    crear_archivo_codigo(ruta, (1, 2, 3, 4, 5))
+    v02.guardar_en_cache(directorio_cache, ruta, (1, 2, 3, 4, 5))
+
+    monkeypatch.setattr(v02, 'VERSION_CACHE', v02.VERSION_CACHE + 1)
+    assert v02.cargar_desde_cache(directorio_cache, ruta) is None
+
+
+def crear_consolidado(directorio):
+    """
+    Crea un 'CONSOLIDADO.xlsx' con una hoja 'EDU' cuya fila 6 tiene el código 'A1' y una
+    fórmula (B6) con su resultado guardado, como lo dejaría Excel.
+    """
+    ruta = os.path.join(directorio, 'CONSOLIDADO.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'EDU'
+    for fila in range(1, 5):
+        ws.append([f"Título {fila}"])
+    ws.append(['Número', 'Cálculo', None, 'Código'])
+    ws.append([6, '=A6*10', None, 'A1'])
+    wb.save(ruta)
+    # openpyxl no guarda el resultado de las fórmulas: se añade el que guardaría Excel.
+    reescribir_parte(ruta, 'xl/worksheets/sheet1.xml', [(r'(<c r="B6"><f>A6\*10</f>)<v></v>', r'\1<v>60</v>')])
+    crear_archivo_codigo(os.path.join(directorio, 'A1.xlsx'), (1, 2, 3, 4, 5))
+
+
+def ejecutar(directorio, monkeypatch, *argumentos):
+    """Ejecuta el script en `directorio` con los argumentos dados (lectura en hilos, sin caché)."""
+    monkeypatch.chdir(directorio)
+    monkeypatch.setattr(sys, 'argv', ['autocompletar_consolidado_v0.2.py', '--no-cache', '--async-io', *argumentos])
+    v02.main()
+
+
+def test_csv_exporta_valores_calculados(tmp_path, monkeypatch):
+    crear_consolidado(str(tmp_path))
+    ejecutar(str(tmp_path), monkeypatch, '--output-format', 'csv')
+
+    with open(tmp_path / 'CONSOLIDADO_COMPLETADO_EDU.csv', newline='', encoding='utf-8-sig') as f:
+        filas = list(csv.reader(f))
+    assert filas[5][:2] == ['6', '60']
+    assert [filas[5][indice] for indice in v02.DEST_APPLY] == ['1', '2', '3', '4', '5']
+
+
+@requiere_pyarrow
+def test_parquet_exporta_valores_calculados(tmp_path, monkeypatch):
+    crear_consolidado(str(tmp_path))
+    ejecutar(str(tmp_path), monkeypatch, '--output-format', 'parquet')
+
+    tabla = v02.pyarrow.parquet.read_table(str(tmp_path / 'CONSOLIDADO_COMPLETADO_EDU.parquet'))
+    assert tabla.column('Cálculo').to_pylist() == ['60']
+    assert tabla.column('F').to_pylist() == ['1']
@@ -0,0 +1,108 @@
+"""
+Pruebas de 'autocompletar_consolidado_v1.0.py'.
+"""
+
+import io
+
+import openpyxl
+import pytest
+
+from conftest import cargar_script, reescribir_parte
+
+v1 = cargar_script('autocompletar_consolidado_v1.0.py')
+
+
+@pytest.fixture(params=['calamine', 'openpyxl'])
+def lector_codigos(request, monkeypatch):
+    """Ejecuta la prueba leyendo los códigos con python-calamine y con openpyxl."""
+    if request.param == 'calamine':
+        if v1.CalamineWorkbook is None:
+            pytest.skip('python-calamine no está instalado')
+    else:
+        monkeypatch.setattr(v1, 'CalamineWorkbook', None)
+    return request.param
+
+
+def test_codigos_con_formula_usan_el_valor_calculado(tmp_path, lector_codigos):
+    ruta = str(tmp_path / 'CONSOLIDADO.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'EDU'
+    ws['D6'] = 'A1'
+    ws['B7'] = 'B'
+    ws['D7'] = '=B7&"2"'
+    ws['D8'] = 101
+    wb.save(ruta)
+    # openpyxl no guarda el resultado de las fórmulas: se añade el que guardaría Excel.
+    reescribir_parte(ruta, 'xl/worksheets/sheet1.xml', [
+        (r'<c r="D7"><f>(.*?)</f><v></v></c>', r'<c r="D7" t="str"><f>\1</f><v>B2</v></c>'),
+    ])
+
+    assert v1.leer_codigos_hoja(ruta, 'EDU') == ['A1', 'B2', 101]
+
+
+def test_formula_sin_valor_calculado_termina_los_codigos(tmp_path, lector_codigos):
+    # Sin resultado guardado la celda está vacía para ambos lectores: ahí terminan los datos.
+    ruta = str(tmp_path / 'CONSOLIDADO.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'EDU'
+    ws['D6'] = 'A1'
+    ws['D7'] = '="B"&"2"'
+    ws['D8'] = 'C3'
+    wb.save(ruta)
+
+    assert v1.leer_codigos_hoja(ruta, 'EDU') == ['A1']
+
+
+def test_formulas_compartidas_entre_hojas():
+    edu = v1.calcular_formulas_hoja([(6, 'X9'), (7, 'Y9')])
+    hosp = v1.calcular_formulas_hoja([(6, 'Y9')])
+
+    assert hosp[0][2] is edu[1][2]
+    assert edu[0][2][0] == v1.PREFIJO_FORMULA + 'X9' + v1.SUFIJO_ENLACE + v1.CELDAS_ORIGEN[0]
+
+
+def hoja_con_formulas_compartidas():
+    """
+    XML de una hoja con dos fórmulas compartidas en las filas 6 a 9: F6:F9 (columna de
+    destino, cuya celda principal se sustituye) y H6:H9 (fuera de las columnas de destino).
+    """
+    filas = []
+    for fila in range(6, 10):
+        if fila == 6:
+            celda_f = '<c r="F6"><f t="shared" ref="F6:F9" si="0">A6*2</f><v>12</v></c>'
+            celda_h = '<c r="H6"><f t="shared" ref="H6:H9" si="1">A6+1</f><v>7</v></c>'
+        else:
+            celda_f = f'<c r="F{fila}"><f t="shared" si="0"/><v>{fila * 2}</v></c>'
+            celda_h = f'<c r="H{fila}"><f t="shared" si="1"/><v>{fila + 1}</v></c>'
+        filas.append(f'<row r="{fila}"><c r="A{fila}"><v>{fila}</v></c>{celda_f}{celda_h}</row>')
+    return (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<worksheet xmlns="{v1.NS_HOJA}"><dimension ref="A1:H9"/>'
+        f'<sheetData>{"".join(filas)}</sheetData></worksheet>'
+    ).encode('utf-8')
+
+
+@pytest.mark.skipif(v1.lxml_etree is None, reason='lxml no está instalado')
+def test_parchear_hoja_expande_formulas_compartidas_y_amplia_dimension():
+    formulas_hoja = v1.calcular_formulas_hoja([(6, 'A1'), (7, 'B2')])
+    destino = io.BytesIO()
+    v1.parchear_hoja(io.BytesIO(hoja_con_formulas_compartidas()), destino, formulas_hoja)
+
+    raiz = v1.lxml_etree.fromstring(destino.getvalue())
+    espacios = {'x': v1.NS_HOJA}
+    assert raiz.find('x:dimension', espacios).get('ref') == 'A1:M9'
+
+    def formula(ref):
+        return raiz.find(f'.//x:c[@r="{ref}"]/x:f', espacios)
+
+    assert formula('F6').text == formulas_hoja[0][2][0][1:]
+    assert formula('F7').text == formulas_hoja[1][2][0][1:]
+    # Las demás celdas del rango F6:F9 reciben la fórmula completa, trasladada a su fila.
+    for fila in (8, 9):
+        assert formula(f'F{fila}').text == f'A{fila}*2'
+        assert formula(f'F{fila}').get('t') is None
+    # La fórmula compartida de H, con su celda principal intacta, se conserva.
+    assert formula('H6').get('ref') == 'H6:H9'
+    assert formula('H9').get('si') == '1'
@@ -0,0 +1,80 @@
+"""
+Pruebas del lector directo del XML de los archivos '[CODIGO].xlsx' (lector_xlsx.py).
+"""
+
+import datetime
+
+import openpyxl
+import pytest
+
+import lector_xlsx
+from conftest import reescribir_parte
+
+CELDAS = frozenset(['N21', 'N25', 'N49', 'N153', 'N161'])
+
+
+def test_celdas_y_filas_sin_referencia(tmp_path, analizador_xml):
+    # Una hoja completa hasta la fila 161 y la columna N, para que las filas y
+    # celdas sin atributo 'r' se sitúen de forma inequívoca a continuación de la anterior.
+    ruta = str(tmp_path / 'sin_r.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for fila in range(1, 162):
+        ws.append([fila * 100 + columna for columna in range(1, 15)])
+    wb.save(ruta)
+    reescribir_parte(ruta, 'xl/worksheets/sheet1.xml', [
+        (r'(<c) r="[A-Z]+\d+"', r'\1'),
+        (r'(<row) r="\d+"', r'\1'),
+    ])
+
+    esperado = {ref: openpyxl.load_workbook(ruta, data_only=True).active[ref].value for ref in CELDAS}
+    assert esperado['N21'] == 2114
+    assert lector_xlsx.leer_cinco_celdas_rapido(ruta, CELDAS) == esperado
+
+
+def test_celdas_sin_referencia_tras_celda_con_referencia(tmp_path, analizador_xml):
+    # Solo la primera celda de la fila indica su columna; las siguientes la continúan.
+    ruta = str(tmp_path / 'mixto.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['L21'], ws['M21'], ws['N21'] = 'l', 'm', 'n'
+    wb.save(ruta)
+    reescribir_parte(ruta, 'xl/worksheets/sheet1.xml', [(r'(<c) r="[MN]21"', r'\1')])
+
+    assert lector_xlsx.leer_cinco_celdas_rapido(ruta, CELDAS)['N21'] == 'n'
+
+
+def test_convertir_valor_xml_fechas():
+    epoca = lector_xlsx.WINDOWS_EPOCH
+    assert lector_xlsx.convertir_valor_xml('n', '45000', [], None, epoca) == 45000
+    assert lector_xlsx.convertir_valor_xml('n', '45000', [], False, epoca) == datetime.datetime(2023, 3, 15)
+    assert lector_xlsx.convertir_valor_xml('n', '45000.5', [], False, epoca) == datetime.datetime(2023, 3, 15, 12)
+    assert lector_xlsx.convertir_valor_xml('n', '1.5', [], True, epoca) == datetime.timedelta(days=1.5)
+    # Fuera del rango de fechas: el mismo error de celda que devuelve openpyxl.
+    assert lector_xlsx.convertir_valor_xml('n', '1E10', [], False, epoca) == '#VALUE!'
+
+
+def test_convertir_valor_xml_calendario_1904():
+    epoca = lector_xlsx.MAC_EPOCH
+    assert lector_xlsx.convertir_valor_xml('n', '1', [], False, epoca) == datetime.datetime(1904, 1, 2)
+    assert lector_xlsx.convertir_valor_xml('n', '43538', [], False, epoca) == datetime.datetime(2023, 3, 15)
+
+
+@pytest.mark.parametrize('epoca', ['WINDOWS_EPOCH', 'MAC_EPOCH'])
+def test_fechas_iguales_que_openpyxl(tmp_path, analizador_xml, epoca):
+    ruta = str(tmp_path / 'fechas.xlsx')
+    wb = openpyxl.Workbook()
+    wb.epoch = getattr(lector_xlsx, epoca)
+    ws = wb.active
+    ws['N21'] = datetime.datetime(2024, 1, 2)
+    ws['N21'].number_format = 'dd/mm/yyyy'
+    ws['N25'] = datetime.timedelta(hours=30)
+    ws['N25'].number_format = '[h]:mm:ss'
+    ws['N49'] = 3
+    ws['N49'].number_format = '0.00'
+    ws['N153'] = 'texto'
+    ws['N161'] = datetime.datetime(2020, 5, 5, 10, 0)
+    wb.save(ruta)
+
+    esperado = {ref: openpyxl.load_workbook(ruta, data_only=True).active[ref].value for ref in CELDAS}
+    assert lector_xlsx.leer_cinco_celdas_rapido(ruta, CELDAS) == esperado